@@ -0,0 +1,79 @@
+"""
+Mock NetworkManager on a private system bus, based on python-dbusmock's
+networkmanager template
+"""
+
+import subprocess
+
+import dbus
+import dbusmock
+
+MOCK_IFACE = "org.freedesktop.DBus.Mock"
+NM_BUS_NAME = "org.freedesktop.NetworkManager"
+NM_PATH = "/org/freedesktop/NetworkManager"
+NM_SETTINGS_PATH = "/org/freedesktop/NetworkManager/Settings"
+NM_SETTINGS_IFACE = "org.freedesktop.NetworkManager.Settings"
+
+class FakeNetworkManager:
+    """
+    Starts a private system bus and exports a mocked NetworkManager on it.
+    DBUS_SYSTEM_BUS_ADDRESS is set for the current process, so it must be
+    started before pyarachnecdl connects to the system bus.
+    """
+    def __init__(self):
+        self._process = None
+        self._mock = None
+        self._bus = None
+        self._device = None
+
+    def start(self):
+        dbusmock.DBusTestCase.start_system_bus()
+        self._process, self._mock = dbusmock.DBusTestCase.spawn_server_template(
+            "networkmanager",
+            {},
+            stdout=subprocess.DEVNULL
+            )
+        self._bus = dbus.SystemBus()
+        self._device = self._mock.AddEthernetDevice("mock_Ethernet1", "eth0", 100, dbus_interface=MOCK_IFACE)
+        return self
+
+    def stop(self):
+        if self._process is not None:
+            self._process.terminate()
+            self._process.wait()
+            self._process = None
+        dbusmock.DBusTestCase.tearDownClass()
+
+    def _settings(self):
+        return self._bus.get_object(NM_BUS_NAME, NM_SETTINGS_PATH)
+
+    def add_connections(self, count: int, con_type: str = "802-3-ethernet", prefix: str = "bench") -> list:
+        """
+        Add count saved connections, returns their object paths
+        """
+        paths = []
+        settings = self._settings()
+        for i in range(count):
+            con = {
+                "connection": {
+                    "id": f"{prefix}-{i}",
+                    "uuid": f"00000000-0000-4000-8000-{i:012d}",
+                    "type": con_type,
+                    },
+                }
+            paths.append(settings.AddConnection(con, dbus_interface=NM_SETTINGS_IFACE))
+        return paths
+
+    def activate(self, con_paths: list):
+        """
+        Mark saved connections as active
+        """
+        for i, path in enumerate(con_paths):
+            self._mock.AddActiveConnection(
+                [self._device],
+                path,
+                "/",
+                f"Active{i}",
+                2,
+                dbus_interface=MOCK_IFACE
+                )
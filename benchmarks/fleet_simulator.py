@@ -0,0 +1,318 @@
+"""
+Simulate a fleet of clients on a virtual clock to see what download
+delay, interval, jitter and backoff do to the admin server
+
+    python benchmarks/fleet_simulator.py --clients 5000 --days 2 --interval 60
+    python benchmarks/fleet_simulator.py --clients 200 --real-downloads
+
+The clients use the real settings parsing and DownloadSchedule for the
+delays, backoff and the catch-up after resume. The timers around it
+follow ArachneConfigDownloader: download after the first delay, skip
+downloads while the network is down, schedule the next download when
+one has finished and, while catching up, retry as soon as the network
+is up. By default the server is a model with limited concurrency that
+answers 503 with Retry-After when it's full. With --real-downloads the
+real Downloader fetches from the local stand-in server at each
+simulated download.
+"""
+
+import argparse
+import heapq
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), "src"))
+sys.path.insert(0, BENCH_DIR)
+
+# pylint: disable=wrong-import-position
+from pyarachnecdl.plain_settings import PlainSettings
+from pyarachnecdl.scheduler import DownloadSchedule
+
+DAY = 24 * 60 * 60
+
+class ServerModel:
+    """
+    Admin server that handles capacity requests at once, each taking
+    service_time seconds
+    """
+    def __init__(self, capacity: int, service_time: float, retry_after: float):
+        self.capacity = capacity
+        self.service_time = service_time
+        self.retry_after = retry_after
+        self._in_flight = []
+        self.peak_concurrency = 0
+
+    def request(self, now: float) -> tuple:
+        """
+        ok and Retry-After for a request at now
+        """
+        while self._in_flight and self._in_flight[0] <= now:
+            heapq.heappop(self._in_flight)
+        if len(self._in_flight) >= self.capacity:
+            return False, self.retry_after
+        heapq.heappush(self._in_flight, now + self.service_time)
+        self.peak_concurrency = max(self.peak_concurrency, len(self._in_flight))
+        return True, None
+
+class RealServer:
+    """
+    Each download is made by the real Downloader against the stand-in server
+    """
+    def __init__(self, workdir: str, config_file: str):
+        from stub_server import StubServer
+        from pyarachnecdl.downloader import Downloader
+        self._server = StubServer().start()
+        self._workdir = workdir
+        self._config_file = config_file
+        self._downloader = Downloader(lambda msg: None, lambda msg: None)
+        self._downloader.session.auth = None
+        self._settings = {}
+        # downloads are made one after the other
+        self.peak_concurrency = None
+        with open(config_file, "a", encoding="utf-8") as f:
+            f.write(f"adminServerurl={self._server.url}\n")
+
+    def change_config(self):
+        self._server.change_config()
+
+    def request(self, client_id: int) -> tuple:
+        settings = self._settings.get(client_id)
+        if settings is None:
+            state_file = os.path.join(self._workdir, f"state-{client_id}.json")
+            settings = PlainSettings(self._config_file, state_file)
+            self._settings[client_id] = settings
+        ok = self._downloader.download(settings, False)
+        return ok, self._downloader.retry_after
+
+    @property
+    def full_responses(self) -> int:
+        return self._server.full_responses
+
+    def stop(self):
+        self._downloader.close()
+        self._server.stop()
+
+class Client:
+    def __init__(self, client_id: int):
+        self.id = client_id
+        self.schedule = DownloadSchedule()
+        # a timer event is only valid for the generation it was armed in
+        self.generation = 0
+        self.timer_at = None
+        self.remaining = None
+        self.awake = False
+        self.config_version = -1
+
+class Simulation:
+    def __init__(self, args, settings, server):
+        self.args = args
+        self.settings = settings
+        self.server = server
+        self.random = random.Random(args.seed)
+        self.clients = [Client(i) for i in range(args.clients)]
+        self._events = []
+        self._seq = 0
+        self.config_version = 0
+        self.stats = {
+            "requests": 0,
+            "successful": 0,
+            "rejected": 0,
+            "network_down": 0,
+            "wasted": 0,
+            }
+        self.buckets = {}
+
+    def _push(self, at: float, kind: str, client=None, generation=None):
+        self._seq += 1
+        heapq.heappush(self._events, (at, self._seq, kind, client, generation))
+
+    def _arm(self, client: Client, now: float, delay: float):
+        client.schedule.set_due(delay, now)
+        if delay is None:
+            return
+        client.generation += 1
+        client.timer_at = now + delay
+        self._push(client.timer_at, "timer", client, client.generation)
+
+    def _login_time(self, day: int) -> float:
+        offset = self.random.gauss(self.args.login_at * 3600, self.args.login_spread)
+        return day * DAY + max(0.0, offset)
+
+    def setup(self):
+        args = self.args
+        for day in range(args.days):
+            for client in self.clients:
+                login = self._login_time(day)
+                self._push(login, "login", client)
+                self._push(login + args.workday * 3600, "logout", client)
+        for i in range(args.config_changes):
+            self._push((i + 1) * args.days * DAY / (args.config_changes + 1), "config_change")
+
+    def _on_login(self, client: Client, now: float):
+        client.awake = True
+        if self.args.overnight == "suspend" and client.remaining is not None:
+            if self.args.monotonic_timers:
+                # QTimer uses the monotonic clock, which stops while suspended
+                self._arm(client, now, client.remaining)
+            else:
+                self._arm(client, now, client.schedule.resume_delay(now))
+        else:
+            client.schedule = DownloadSchedule()
+            self._arm(client, now, client.schedule.first_delay(self.settings))
+        client.remaining = None
+
+    def _on_logout(self, client: Client, now: float):
+        client.awake = False
+        if client.timer_at is not None:
+            client.remaining = max(0.0, client.timer_at - now)
+        client.generation += 1
+        client.timer_at = None
+
+    def _on_timer(self, client: Client, now: float):
+        client.timer_at = None
+        if self.random.random() < self.args.network_down:
+            self.stats["network_down"] += 1
+            if client.schedule.catching_up:
+                # NetworkManager announces the connection when it's up
+                self._arm(client, now, self.args.network_up_after)
+            else:
+                self._arm(client, now, client.schedule.next_delay(self.settings))
+            return
+
+        self.stats["requests"] += 1
+        bucket = int(now // self.args.bucket)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        if isinstance(self.server, ServerModel):
+            ok, retry_after = self.server.request(now)
+        else:
+            ok, retry_after = self.server.request(client.id)
+        if ok:
+            self.stats["successful"] += 1
+            if client.config_version == self.config_version:
+                self.stats["wasted"] += 1
+            client.config_version = self.config_version
+            client.schedule.record_success()
+        else:
+            self.stats["rejected"] += 1
+            client.schedule.record_failure(retry_after)
+        self._arm(client, now, client.schedule.next_delay(self.settings))
+
+    def run(self):
+        self.setup()
+        while self._events:
+            now, _, kind, client, generation = heapq.heappop(self._events)
+            if kind == "login":
+                self._on_login(client, now)
+            elif kind == "logout":
+                self._on_logout(client, now)
+            elif kind == "config_change":
+                self.config_version += 1
+                if isinstance(self.server, RealServer):
+                    self.server.change_config()
+            elif kind == "timer" and client.awake and generation == client.generation:
+                self._on_timer(client, now)
+
+    def report(self) -> dict:
+        rates = [count / self.args.bucket for count in self.buckets.values()]
+        series = [
+            {"time": bucket * self.args.bucket, "requests": count}
+            for bucket, count in sorted(self.buckets.items())
+            ]
+        result = {
+            "parameters": vars(self.args),
+            "totals": self.stats,
+            "peak_requests_per_second": round(max(rates, default=0), 3),
+            "mean_requests_per_second": round(
+                self.stats["requests"] / (self.args.days * DAY), 5
+                ),
+            "peak_concurrency": self.server.peak_concurrency,
+            "requests_over_time": series,
+            }
+        if isinstance(self.server, RealServer):
+            result["full_responses"] = self.server.full_responses
+        return result
+
+def write_config(path: str, args):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(
+            "[General]\n"
+            f"downloadDelay={args.delay}\n"
+            "downloadDelayUnit=SEC\n"
+            f"downloadInterval={args.interval * 60}\n"
+            "downloadIntervalUnit=SEC\n"
+            f"downloadJitter={args.jitter}\n"
+            f"maxBackoff={args.max_backoff}\n"
+            "downloadType=OVPN\n"
+            )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=1)
+    parser.add_argument("--delay", type=int, default=300, help="first download delay in seconds")
+    parser.add_argument("--interval", type=int, default=60, help="download interval in minutes")
+    parser.add_argument("--jitter", type=int, default=20, help="jitter in percent")
+    parser.add_argument("--max-backoff", type=int, default=6 * 60 * 60)
+    parser.add_argument("--login-at", type=float, default=8.0, help="mean login hour")
+    parser.add_argument("--login-spread", type=float, default=1800, help="std dev of login times in seconds")
+    parser.add_argument("--workday", type=float, default=9.0, help="hours until suspend or logout")
+    parser.add_argument("--overnight", choices=("suspend", "logout"), default="suspend")
+    parser.add_argument("--monotonic-timers", action="store_true",
+                        help="timers ignore the time suspended, no catch-up download after resume")
+    parser.add_argument("--network-down", type=float, default=0.01,
+                        help="probability the network is down at a scheduled download")
+    parser.add_argument("--network-up-after", type=float, default=30,
+                        help="seconds until a down network is up again after resume")
+    parser.add_argument("--config-changes", type=int, default=0,
+                        help="configuration changes on the server, evenly spread")
+    parser.add_argument("--capacity", type=int, default=20, help="concurrent requests of the model server")
+    parser.add_argument("--service-time", type=float, default=0.05, help="seconds per request")
+    parser.add_argument("--retry-after", type=float, default=120, help="Retry-After of a full server")
+    parser.add_argument("--real-downloads", action="store_true", help="download from the stand-in server")
+    parser.add_argument("--bucket", type=int, default=60, help="seconds per request rate bucket")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the report as JSON to this file")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    with tempfile.TemporaryDirectory(prefix="pyarachnecdl-fleet-") as workdir:
+        os.environ["HOME"] = workdir
+        config_file = os.path.join(workdir, "pyarachnecdl.conf")
+        write_config(config_file, args)
+        if args.real_downloads:
+            server = RealServer(workdir, config_file)
+        else:
+            server = ServerModel(args.capacity, args.service_time, args.retry_after)
+        settings = PlainSettings(config_file, os.path.join(workdir, "state.json")).snapshot
+
+        start = time.perf_counter()
+        simulation = Simulation(args, settings, server)
+        try:
+            simulation.run()
+        finally:
+            if args.real_downloads:
+                server.stop()
+        report = simulation.report()
+        report["wall_seconds"] = round(time.perf_counter() - start, 3)
+
+    totals = report["totals"]
+    print(
+        f"{totals['requests']} requests, {totals['rejected']} rejected, "
+        f"{totals['wasted']} wasted, peak {report['peak_requests_per_second']} req/s, "
+        f"peak concurrency {report['peak_concurrency']}",
+        file=sys.stderr
+        )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+if __name__ == "__main__":
+    main()
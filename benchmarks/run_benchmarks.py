@@ -0,0 +1,312 @@
+"""
+Benchmarks for the download path against a local stand-in server and a
+mocked NetworkManager
+
+    python benchmarks/run_benchmarks.py --output results.json
+    python benchmarks/run_benchmarks.py --compare results.json
+
+The NetworkManager benchmarks need python-dbusmock and dbus-daemon and
+are skipped with --no-nm.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+from requests.auth import AuthBase
+from requests.cookies import extract_cookies_to_jar
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(os.path.dirname(BENCH_DIR), "src")
+sys.path.insert(0, SRC_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+# pylint: disable=wrong-import-position
+from stub_server import StubServer, make_json_config
+
+class FakeNegotiateAuth(AuthBase):
+    """
+    Answers a Negotiate challenge with a dummy token, stands in for
+    HTTPKerberosAuth without a KDC
+    """
+    def __call__(self, r):
+        r.register_hook("response", self._handle_401)
+        return r
+
+    @staticmethod
+    def _handle_401(r, **kwargs):
+        if r.status_code != 401 or "Negotiate" not in r.headers.get("WWW-Authenticate", ""):
+            return r
+        # pylint: disable=pointless-statement,protected-access
+        r.content
+        r.close()
+        prep = r.request.copy()
+        extract_cookies_to_jar(prep._cookies, r.request, r.raw)
+        prep.prepare_cookies(prep._cookies)
+        prep.headers["Authorization"] = "Negotiate ZmFrZQ=="
+        r2 = r.connection.send(prep, **kwargs)
+        r2.history.append(r)
+        r2.request = prep
+        return r2
+
+def summarize(samples: list) -> dict:
+    ms = sorted(s * 1000 for s in samples)
+    return {
+        "n": len(ms),
+        "min_ms": round(ms[0], 3),
+        "median_ms": round(statistics.median(ms), 3),
+        "mean_ms": round(statistics.fmean(ms), 3),
+        "p95_ms": round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 3),
+        "max_ms": round(ms[-1], 3),
+        }
+
+def measure(fn, iterations: int, setup=None) -> list:
+    samples = []
+    for _ in range(iterations):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def download(downloader, settings):
+    # errors aren't reported without show_info, a failed download must
+    # not be timed as a successful one
+    if not downloader.download(settings, False):
+        raise RuntimeError(f"Download of profile '{settings.profile}' failed")
+
+def write_config(path: str, url: str, dest: str):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(
+            "[General]\n"
+            f"adminServerurl={url}\n"
+            "downloadType=OVPN\n"
+            f"downloadDestination={dest}\n"
+            "maxDownloadSize=16777216\n"
+            "\n"
+            "[profile nm]\n"
+            f"adminServerurl={url}\n"
+            "downloadType=NETWORK_MANAGER\n"
+            )
+
+class Benchmarks:
+    def __init__(self, args, workdir: str):
+        self.args = args
+        self.workdir = workdir
+        self.results = {}
+        self.config_file = os.path.join(workdir, "pyarachnecdl.conf")
+        self.state_file = os.path.join(workdir, "state.json")
+
+    def _settings(self, profile: str = ""):
+        from pyarachnecdl.plain_settings import PlainSettings
+        return PlainSettings(self.config_file, self.state_file, profile)
+
+    @staticmethod
+    def _downloader(negotiate: bool = False):
+        from pyarachnecdl.downloader import Downloader
+        def fail(msg):
+            raise RuntimeError(msg)
+        downloader = Downloader(lambda msg: None, fail)
+        if negotiate:
+            downloader.session.auth = FakeNegotiateAuth()
+        else:
+            downloader.session.auth = None
+        return downloader
+
+    def record(self, name: str, samples: list, **extra):
+        self.results[name] = summarize(samples) | extra
+        print(f"{name:32} median {self.results[name]['median_ms']:10.3f} ms", file=sys.stderr)
+
+    def run_download(self):
+        from pyarachnecdl.settings_types import DownloadType
+        args = self.args
+        server = StubServer(
+            latency=args.latency,
+            payload_size=args.payload_size
+            ).start()
+        try:
+            write_config(self.config_file, server.url, os.path.join(self.workdir, "ovpn"))
+            settings = self._settings()
+            downloader = self._downloader()
+
+            def clear_validators():
+                settings.set_cache_validators(DownloadType.OVPN, "", "", "")
+            self.record(
+                "download_ovpn_full",
+                measure(lambda: download(downloader, settings), args.iterations, clear_validators),
+                payload_bytes=len(server._payloads["ovpn"])
+                )
+
+            download(downloader, settings)
+            requests_before = server.requests
+            full_responses_before = server.full_responses
+            self.record(
+                "download_ovpn_not_modified",
+                measure(lambda: download(downloader, settings), args.iterations),
+                full_responses=server.full_responses - full_responses_before,
+                requests=server.requests - requests_before
+                )
+            downloader.close()
+
+            server.negotiate = True
+            def cold_negotiate():
+                d = self._downloader(negotiate=True)
+                clear_validators()
+                download(d, settings)
+                d.close()
+            requests_before = server.requests
+            self.record(
+                "download_negotiate_cold",
+                measure(cold_negotiate, args.iterations),
+                requests_per_download=(server.requests - requests_before) / args.iterations
+                )
+
+            downloader = self._downloader(negotiate=True)
+            download(downloader, settings)
+            requests_before = server.requests
+            self.record(
+                "download_negotiate_warm",
+                measure(lambda: download(downloader, settings), args.iterations, clear_validators),
+                requests_per_download=(server.requests - requests_before) / args.iterations
+                )
+            downloader.close()
+        finally:
+            server.stop()
+
+    def run_save_certs(self):
+        settings = self._settings("nm")
+        downloader = self._downloader()
+        json_data = json.loads(make_json_config(self.args.payload_size))
+        self.record(
+            "save_certs",
+            measure(lambda: downloader._save_certs(settings, json_data), self.args.iterations)
+            )
+
+    def run_network_manager(self):
+        from fake_network_manager import FakeNetworkManager
+        fake_nm = FakeNetworkManager().start()
+        try:
+            from pyarachnecdl import network_manager_connection as nm
+            settings = self._settings("nm")
+            downloader = self._downloader()
+            json_data = json.loads(make_json_config(self.args.payload_size))
+            downloader._save_certs(settings, json_data)
+
+            settings.connection_uuid = ""
+            self.record(
+                "nm_add_connection",
+                measure(
+                    lambda: downloader._update_networkmaneger_connection(settings, json_data, False),
+                    1
+                    )
+                )
+            self.record(
+                "nm_update_connection",
+                measure(
+                    lambda: downloader._update_networkmaneger_connection(settings, json_data, False),
+                    self.args.iterations
+                    )
+                )
+
+            paths = fake_nm.add_connections(self.args.connections)
+            fake_nm.activate(paths[:self.args.active_connections])
+            self.record(
+                "nm_get_all",
+                measure(nm.get_all, self.args.iterations),
+                connections=len(paths) + 1
+                )
+            self.record(
+                "nm_get_all_active",
+                measure(nm.get_all_active, self.args.iterations),
+                active_connections=self.args.active_connections
+                )
+        finally:
+            fake_nm.stop()
+
+    def run_cold_start(self):
+        env = dict(os.environ, PYTHONPATH=SRC_DIR)
+        for name, module in (
+                ("cold_start_cli", "pyarachnecdl.cli"),
+                ("cold_start_headless", "pyarachnecdl.headless"),
+                ("cold_start_gui", "pyarachnecdl.arachne_config_downloader"),
+                ):
+            def run():
+                # pylint: disable=cell-var-from-loop
+                subprocess.run(
+                    [sys.executable, "-c", f"import {module}"],
+                    env=env,
+                    check=True,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL
+                    )
+            try:
+                self.record(name, measure(run, self.args.cold_iterations))
+            except subprocess.CalledProcessError as ex:
+                self.results[name] = {"error": str(ex)}
+                print(f"{name:32} failed", file=sys.stderr)
+
+def compare(results: dict, baseline_file: str):
+    with open(baseline_file, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    print(f"{'benchmark':32} {'baseline':>12} {'current':>12} {'ratio':>8}")
+    for name, result in results.items():
+        old = baseline.get(name, {}).get("median_ms")
+        new = result.get("median_ms")
+        if old is None or new is None:
+            continue
+        print(f"{name:32} {old:12.3f} {new:12.3f} {new / old:8.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--cold-iterations", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.0, help="server latency in seconds")
+    parser.add_argument("--payload-size", type=int, default=6000)
+    parser.add_argument("--connections", type=int, default=200, help="saved connections in the mock NM")
+    parser.add_argument("--active-connections", type=int, default=3)
+    parser.add_argument("--no-nm", action="store_true", help="skip the NetworkManager benchmarks")
+    parser.add_argument("--no-cold-start", action="store_true", help="skip the cold start benchmarks")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="compare with the results in this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="pyarachnecdl-bench-") as workdir:
+        # certificates and configurations are written below $HOME
+        os.environ["HOME"] = workdir
+        benchmarks = Benchmarks(args, workdir)
+        benchmarks.run_download()
+        benchmarks.run_save_certs()
+        if not args.no_nm:
+            benchmarks.run_network_manager()
+        if not args.no_cold_start:
+            benchmarks.run_cold_start()
+
+    output = {
+        "meta": {
+            "timestamp": int(time.time()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "requests": requests.__version__,
+            "parameters": vars(args),
+            },
+        "results": benchmarks.results,
+        }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=2)
+    else:
+        json.dump(output, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        compare(benchmarks.results, args.compare)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+Local stand-in for the Arachne admin server's user_config API
+
+    python benchmarks/stub_server.py --port 8080 --latency 0.05 --negotiate
+"""
+
+import argparse
+import hashlib
+import json
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+USER_CONFIG_PATH = "/arachne/api/openvpn/user_config"
+USER_CONFIG_EVENTS_PATH = USER_CONFIG_PATH + "/events"
+
+_PEM_LINE = "MIIDazCCAlOgAwIBAgIUJ0bV1kK1yq3cR7l7h3sSL0m3QmIwDQYJKoZIhvcNAQEL"
+
+def _pem(kind: str, size: int) -> str:
+    lines = max(1, size // (len(_PEM_LINE) + 1))
+    body = "\n".join([_PEM_LINE] * lines)
+    return f"-----BEGIN {kind}-----\n{body}\n-----END {kind}-----\n"
+
+def make_json_config(size: int, version: int = 0) -> bytes:
+    config = {
+        "name": "Arachne",
+        "version": version,
+        "certificates": {
+            "caCert": _pem("CERTIFICATE", size // 3),
+            "userCert": _pem("CERTIFICATE", size // 3),
+            "privateKey": _pem("PRIVATE KEY", size // 3),
+            },
+        "data": {
+            "remote": "vpn.example.com:1194",
+            "connection-type": "tls",
+            "dev": "tun",
+            },
+        "ipv4": {
+            "never-default": True,
+            "dns-search": ["example.com"],
+            "dns": ["192.0.2.53"],
+            },
+        }
+    return json.dumps(config).encode("utf-8")
+
+def make_ovpn_config(size: int, version: int = 0) -> bytes:
+    return (
+        f"# version {version}\nclient\ndev tun\nremote vpn.example.com 1194\n"
+        f"<ca>\n{_pem('CERTIFICATE', size // 3)}</ca>\n"
+        f"<cert>\n{_pem('CERTIFICATE', size // 3)}</cert>\n"
+        f"<key>\n{_pem('PRIVATE KEY', size // 3)}</key>\n"
+        ).encode("utf-8")
+
+class StubServer:
+    """
+    Serves USER_CONFIG_PATH as JSON (?format=json) or .ovpn. Supports
+    conditional requests, artificial latency and an emulated Negotiate
+    exchange that issues a session cookie. Each change of the payload
+    gets a new version, so it's a different body with a different ETag.
+    USER_CONFIG_EVENTS_PATH is a server-sent event stream that announces
+    payload changes, unless events is False.
+    """
+    def __init__(self, port: int = 0, latency: float = 0.0, payload_size: int = 6000,
+                 negotiate: bool = False, status: int = 200, retry_after: str = None,
+                 events: bool = True, heartbeat: float = 15.0):
+        self.latency = latency
+        self.events = events
+        self.heartbeat = heartbeat
+        self.subscribers = 0
+        self._version = 0
+        self._stopping = False
+        self._changed = threading.Condition()
+        self.negotiate = negotiate
+        self.status = status
+        self.retry_after = retry_after
+        self.requests = 0
+        self.full_responses = 0
+        self._sessions = set()
+        self._lock = threading.Lock()
+        self.set_payload_size(payload_size)
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._thread = None
+
+    def set_payload_size(self, size: int):
+        self._payload_size = size
+        self.change_config()
+
+    def change_config(self):
+        with self._changed:
+            version = self._version + 1
+            payloads = {
+                "json": make_json_config(self._payload_size, version),
+                "ovpn": make_ovpn_config(self._payload_size, version),
+                }
+            self._etags = {
+                fmt: '"' + hashlib.sha256(payload).hexdigest()[:16] + '"'
+                for fmt, payload in payloads.items()
+                }
+            self._payloads = payloads
+            self._version = version
+            self._changed.notify_all()
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/arachne"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._changed:
+            self._stopping = True
+            self._changed.notify_all()
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # headers and body are written separately, with Nagle's
+            # algorithm the body waits for the client's delayed ACK
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                # pylint: disable=redefined-builtin
+                pass
+
+            def _send(self, status: int, body: bytes = b"", headers: dict = None):
+                self.send_response(status)
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if body:
+                    self.wfile.write(body)
+
+            def _authenticated(self, headers: dict) -> bool:
+                if not server.negotiate:
+                    return True
+                cookie = self.headers.get("Cookie", "")
+                with server._lock:
+                    for part in cookie.split(";"):
+                        if part.strip().removeprefix("SESSION=") in server._sessions:
+                            return True
+                if self.headers.get("Authorization", "").startswith("Negotiate "):
+                    session = secrets.token_hex(8)
+                    with server._lock:
+                        server._sessions.add(session)
+                    headers["Set-Cookie"] = f"SESSION={session}; Path=/; HttpOnly"
+                    return True
+                return False
+
+            def _event_stream(self, headers: dict):
+                self.send_response(200)
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                with server._changed:
+                    server.subscribers += 1
+                    version = server._version
+                try:
+                    self.wfile.write(b": connected\n\n")
+                    self.wfile.flush()
+                    while True:
+                        with server._changed:
+                            server._changed.wait_for(
+                                lambda: server._stopping or server._version != version,
+                                server.heartbeat
+                                )
+                            if server._stopping:
+                                return
+                            changed = server._version != version
+                            version = server._version
+                        if changed:
+                            self.wfile.write(f"id: {version}\nevent: changed\ndata: {version}\n\n".encode())
+                        else:
+                            self.wfile.write(b": heartbeat\n\n")
+                        self.wfile.flush()
+                except OSError:
+                    pass
+                finally:
+                    with server._changed:
+                        server.subscribers -= 1
+
+            def do_GET(self):
+                # pylint: disable=invalid-name
+                with server._lock:
+                    server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                url = urlparse(self.path)
+                if url.path == USER_CONFIG_EVENTS_PATH and server.events:
+                    headers = {}
+                    if not self._authenticated(headers):
+                        self._send(401, b"", {"WWW-Authenticate": "Negotiate"})
+                        return
+                    self._event_stream(headers)
+                    return
+                if url.path != USER_CONFIG_PATH:
+                    self._send(404)
+                    return
+                if server.status != 200:
+                    headers = {}
+                    if server.retry_after is not None:
+                        headers["Retry-After"] = server.retry_after
+                    self._send(server.status, b"", headers)
+                    return
+
+                headers = {}
+                if not self._authenticated(headers):
+                    self._send(401, b"", {"WWW-Authenticate": "Negotiate"})
+                    return
+
+                fmt = "json" if parse_qs(url.query).get("format") == ["json"] else "ovpn"
+                etag = server._etags[fmt]
+                headers["ETag"] = etag
+                if self.headers.get("If-None-Match") == etag:
+                    self._send(304, b"", headers)
+                    return
+                with server._lock:
+                    server.full_responses += 1
+                headers["Content-Type"] = "application/json" if fmt == "json" else "application/x-openvpn-profile"
+                self._send(200, server._payloads[fmt], headers)
+
+        return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--payload-size", type=int, default=6000, help="approximate payload size in bytes")
+    parser.add_argument("--negotiate", action="store_true", help="emulate a Negotiate exchange with session cookie")
+    parser.add_argument("--no-events", action="store_true", help="answer the event stream with 404")
+    args = parser.parse_args()
+
+    server = StubServer(args.port, args.latency, args.payload_size, args.negotiate,
+                        events=not args.no_events)
+    print(f"Serving {server.url}{USER_CONFIG_PATH.removeprefix('/arachne')}")
+    try:
+        server.start()._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -51,6 +51,8 @@ desktop-file-edit --set-name=%{name} \
     --set-key=Exec --set-value=%{name} \
     %{buildroot}/%{autostart_dir}/%{name}.desktop
 
+install -D -m 644 %{name}.service %{buildroot}/%{_userunitdir}/%{name}.service
+
 %files
 %doc README.md
 %license LICENSE
@@ -58,6 +60,7 @@ desktop-file-edit --set-name=%{name} \
 %{python3_sitelib}
 %{desktop_dir}/%{name}.desktop
 %{autostart_dir}/%{name}.desktop
+%{_userunitdir}/%{name}.service
 
 %changelog
 * Wed Aug 13 2025 root@len-pf287tj6.nieslony.internal <github@nieslony.at> 1.4.0-1
@@ -13,7 +13,7 @@ setup(
         },
     entry_points = {
         'console_scripts': [
-            'pyarachnecdl = pyarachnecdl.arachne_config_downloader:main',
+            'pyarachnecdl = pyarachnecdl.cli:main',
         ],
     },
     package_data={
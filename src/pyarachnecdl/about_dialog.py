@@ -7,14 +7,12 @@ from PyQt6.QtWidgets import (
     QVBoxLayout,
     QHBoxLayout,
     )
-from PyQt6.QtGui import (
-    QIcon,
-    )
 from PyQt6.QtCore import (
     Qt
     )
 
 from .version import VERSION
+from .icon_cache import IconColor
 
 class AboutDialog(QDialog):
     def __init__(self):
@@ -23,7 +21,7 @@ class AboutDialog(QDialog):
         self.setWindowTitle(f"About {app.applicationDisplayName()}")
 
         icon = QToolButton()
-        icon.setIcon(QIcon(app.icon_pixmap))
+        icon.setIcon(app.icons.icon(IconColor.GREEN))
         icon.setMinimumHeight(48)
         icon.setMinimumWidth(48)
 
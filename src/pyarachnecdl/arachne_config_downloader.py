@@ -2,21 +2,10 @@
 Arachne Config Downloader
 """
 
-import importlib.resources
 import sys
-import os
 import datetime
 import time
-import json
-import socket
-import stat
-import threading
 
-import netaddr
-import requests
-from requests_kerberos import HTTPKerberosAuth, OPTIONAL
-
-import dbus
 from PyQt6.QtWidgets import (
     QApplication,
     QSystemTrayIcon,
@@ -24,25 +13,32 @@ from PyQt6.QtWidgets import (
     QDialog
     )
 from PyQt6.QtGui import (
-    QIcon,
     QDesktopServices
     )
 from PyQt6.QtCore import (
-    QDir,
+    QCoreApplication,
     QUrl,
-    QFile
+    QTimer,
+    pyqtSignal
     )
 
-import pyarachnecdl.data
-from .settings_dialog import SettingsDialog
-from .about_dialog import AboutDialog
-from .settings import Settings, DownloadType, TimeUnit
+from .icon_cache import IconCache, IconColor
+from .settings import Settings
+from .settings_types import MAX_DOWNLOAD_WORKERS
+from .scheduler import DownloadSchedule
+from .metrics import metrics
 from . import network_manager_connection
-from .network_manager_connection import ConnectionType
+from . import startup_profile
+from . import memory_report
+from . import single_instance
 
-USER_CONFIG_API_PATH = "/api/openvpn/user_config"
+# milliseconds before a scheduled download to acquire the service tickets
+PREFETCH_LEAD = 60 * 1000
 
 class ArachneConfigDownloader(QApplication):
+    # emitted by the subscriptions' threads
+    _config_changed = pyqtSignal(str)
+
     def __init__(self):
         super().__init__(sys.argv)
         self.setOrganizationName("Claas Nieslony")
@@ -51,83 +47,157 @@ class ArachneConfigDownloader(QApplication):
         self.setDesktopFileName("arachne-cdl")
         self.setQuitOnLastWindowClosed(False)
 
-        self._ca_file_name = ""
-        self._cert_file_name = ""
-        self._key_file_name = ""
+        startup_profile.mark("QApplication")
 
         self.settings = Settings()
         self.settings.sync()
-
-        self.icon_blue = QIcon(
-            str(importlib.resources.files(pyarachnecdl.data) / "arachne-blue.svg")
-            )
-        self.icon_green = QIcon(
-            str(importlib.resources.files(pyarachnecdl.data) / "arachne-green.svg")
-            )
-        self.icon_red = QIcon(
-            str(importlib.resources.files(pyarachnecdl.data) / "arachne-red.svg")
-            )
-        self.icon_yellow = QIcon(
-            str(importlib.resources.files(pyarachnecdl.data) / "arachne-yellow.svg")
-            )
-        self.icon_pixmap = self.icon_green.pixmap(16, 16)
+        startup_profile.mark("settings")
+
+        # created on first use
+        self._nm_state = None
+        self._download_workers = []
+
+        self._downloads_running = set()
+        self._download_show_info = False
+
+        self.download_schedule = DownloadSchedule()
+        self._cycle_ok = True
+        self._cycle_retry_after = None
+        self.download_timer = QTimer(self)
+        self.download_timer.setSingleShot(True)
+        self.download_timer.timeout.connect(self._scheduled_download)
+        self._kerberos_state = None
+        self._waiting_for_ticket = False
+        self.prefetch_timer = QTimer(self)
+        self.prefetch_timer.setSingleShot(True)
+        self.prefetch_timer.timeout.connect(self._prefetch_service_tickets)
+        self._suspended = False
+        self._subscriptions = {}
+        self._config_changed.connect(self._on_config_changed)
+
+        self.icons = IconCache()
+        startup_profile.mark("icons")
 
         self._create_system_tray()
-
-        if self.settings.auto_download:
-            if self.settings.download_delay_unit == TimeUnit.SEC:
-                delay = self.settings.download_delay
-            elif self.settings.download_delay_unit == TimeUnit.MIN:
-                delay = self.settings.download_delay * 60
-            elif self.settings.download_delay_unit == TimeUnit.HOUR:
-                delay = self.settings.download_delay * 60 * 60
-            else:
-                return
-            self.download_thread = threading.Timer(delay, self._scheduled_download)
-            self.download_thread.start()
+        startup_profile.mark("system tray")
+
+        from .instance_service import InstanceService
+        self._instance_service = InstanceService(self)
+        self._instance_service.download_now_requested.connect(self._on_download_now)
+        self._instance_service.settings_requested.connect(self._on_settings)
+        if not self._instance_service.register():
+            print("Cannot register on the session bus, commands of other instances are ignored", file=sys.stderr)
+        self._settings_dialog = None
+        startup_profile.mark("instance service")
+
+        from .sleep_state import SleepState
+        self._sleep_state = SleepState()
+        self._sleep_state.suspending.connect(self._on_suspending)
+        self._sleep_state.resumed.connect(self._on_resumed)
+        startup_profile.mark("sleep state")
+
+        settings = self.settings.snapshot
+        if settings.auto_download:
+            self._schedule_download(self.download_schedule.first_delay(settings))
+
+    @property
+    def nm_state(self):
+        if self._nm_state is None:
+            from .network_manager_state import NetworkManagerState
+            self._nm_state = NetworkManagerState()
+            self._nm_state.active_connections_changed.connect(self._on_active_connections_changed)
+        return self._nm_state
+
+    @property
+    def kerberos_state(self):
+        if self._kerberos_state is None:
+            from .kerberos_state import KerberosState
+            self._kerberos_state = KerberosState()
+            self._kerberos_state.ticket_acquired.connect(self._on_ticket_acquired)
+        return self._kerberos_state
+
+    def _has_kerberos_ticket(self) -> bool:
+        if not self.settings.snapshot.require_kerberos_ticket:
+            return True
+        return self.kerberos_state.has_ticket
+
+    def _download_worker(self, index: int):
+        # A profile always goes to the same worker, so its HTTP session
+        # stays warm. At most MAX_DOWNLOAD_WORKERS downloads run at once.
+        index %= MAX_DOWNLOAD_WORKERS
+        if index >= len(self._download_workers):
+            from .download_worker import DownloadWorker
+            for i in range(len(self._download_workers), index + 1):
+                worker = DownloadWorker(f"DownloadWorker-{i}")
+                worker.info.connect(self._on_download_info)
+                worker.error.connect(self._on_download_error)
+                worker.finished.connect(self._on_download_finished)
+                self._download_workers.append(worker)
+        return self._download_workers[index]
+
+    @staticmethod
+    def _download_status(last_successful_download: int, now: float) -> tuple:
+        dt = datetime.datetime.fromtimestamp(last_successful_download)
+        if last_successful_download == -1:
+            return IconColor.BLUE, "Configuration has nevew been downloaded"
+        if now - last_successful_download < 7 * 24 * 60 * 60:
+            return IconColor.GREEN, f"Last configuration update: {dt.ctime()}"
+        if now - last_successful_download < 31 * 24 * 60 * 60:
+            return IconColor.YELLOW, f"Error: Last configuration update more than 7 days ago: {dt.ctime()}"
+        return IconColor.RED, f"Error: Last configuration update more than 31 days ago: {dt.ctime()}"
+
+    @staticmethod
+    def _certificate_status(certificate_expiry: int, now: float) -> tuple:
+        if certificate_expiry == -1:
+            return None, None
+        dt = datetime.datetime.fromtimestamp(certificate_expiry)
+        if certificate_expiry < now:
+            return IconColor.RED, f"Error: Certificate expired: {dt.ctime()}"
+        if certificate_expiry - now < 7 * 24 * 60 * 60:
+            return IconColor.YELLOW, f"Certificate expires in less than 7 days: {dt.ctime()}"
+        return IconColor.GREEN, f"Certificate valid until: {dt.ctime()}"
+
+    def _certificate_expiry(self) -> int:
+        expiries = [
+            self.settings.profile_settings(profile).certificate_expiry
+            for profile in self.settings.profile_names
+            ]
+        return min((e for e in expiries if e != -1), default=-1)
 
     def _update_status(self):
-        last_successful_download = self.settings.last_successful_download
-        dt = datetime.datetime.fromtimestamp(last_successful_download)
+        # the tray shows the worst status of all profiles
+        severity = [IconColor.GREEN, IconColor.BLUE, IconColor.YELLOW, IconColor.RED]
         now = time.time()
-
-        if last_successful_download == -1:
-            self.tray_icon.setIcon(self.icon_blue)
-            self.tray_icon.setToolTip(
-                f"{self.applicationName()}\nConfiguration has nevew been downloaded"
-                )
-        elif now - last_successful_download < 7 * 24 * 60 * 60:
-            self.tray_icon.setIcon(self.icon_green)
-            self.tray_icon.setToolTip(
-                f"{self.applicationName()}\nLast configuration update: {dt.ctime()}"
-                )
-        elif now - last_successful_download < 31 * 24 * 60 * 60:
-            self.tray_icon.setIcon(self.icon_yellow)
-            self.tray_icon.setToolTip(
-                f"{self.applicationName()}\nError: Last configuration update more than 7 days ago: {dt.ctime()}"
-                )
-        else:
-            self.tray_icon.setIcon(self.icon_red)
-            self.tray_icon.setToolTip(
-                f"{self.applicationName()}\nError: Last configuration update more than 31 days ago: {dt.ctime()}"
-                )
+        color = IconColor.GREEN
+        lines = [self.applicationName()]
+        for profile in self.settings.profile_names:
+            profile_settings = self.settings.profile_settings(profile)
+            for profile_color, msg in (
+                    self._download_status(profile_settings.last_successful_download, now),
+                    self._certificate_status(profile_settings.certificate_expiry, now)
+                    ):
+                if profile_color is None:
+                    continue
+                if severity.index(profile_color) > severity.index(color):
+                    color = profile_color
+                lines.append(f"{profile}: {msg}" if profile else msg)
+            summary = metrics.summary(profile)
+            if summary:
+                lines.append(f"{profile}: {summary}" if profile else summary)
+
+        self.tray_icon.setIcon(self.icons.icon(color))
+        self.tray_icon.setToolTip("\n".join(lines))
 
     def _is_nm_connection_allowed(self) -> bool:
-        allowed_cons = self.settings.allowed_connections
-        for con in network_manager_connection.get_all_active():
-            if con.uuid in allowed_cons:
-                return True
-            if con.con_type == ConnectionType.WIFI and self.settings.allow_download_from_wifi:
-                return True
-            if con.con_type == ConnectionType.WIRED and self.settings.allow_download_from_wired:
-                return True
-            if con.con_type == ConnectionType.VPN and \
-               con.uuid == self.settings.connection_uuid and \
-               self.settings.allow_download_from_vpn:
-                return True
-
-        return False
-
+        vpn_uuids = [
+            self.settings.profile_settings(profile).connection_uuid
+            for profile in self.settings.profile_names
+            ]
+        return network_manager_connection.is_download_allowed(
+            self.settings.snapshot,
+            self.nm_state.active_connections,
+            vpn_uuids
+            )
 
     def _create_system_tray(self):
         self.menu = QMenu(None)
@@ -151,170 +221,247 @@ class ArachneConfigDownloader(QApplication):
     def _info(self, msg):
         self.tray_icon.showMessage("Info", msg, QSystemTrayIcon.MessageIcon.Information)
 
+    def _schedule_download(self, delay: float):
+        if delay is None:
+            return
+        # QTimer's interval is a signed 32 bit number of milliseconds
+        delay_ms = min(int(delay * 1000), 2**31 - 1)
+        self.download_schedule.set_due(delay_ms / 1000)
+        self.download_timer.start(delay_ms)
+        if self.settings.snapshot.prefetch_service_ticket:
+            self.prefetch_timer.start(max(0, delay_ms - PREFETCH_LEAD))
+
+    def _schedule_next_download(self):
+        settings = self.settings.snapshot
+        if settings.auto_download:
+            self._schedule_download(
+                self.download_schedule.next_delay(settings, self._certificate_expiry())
+                )
+
     def _scheduled_download(self):
-        if self._is_nm_connection_allowed():
-            self._on_download_now(False)
-        if self.settings.auto_download:
-            if self.settings.download_interval_unit == TimeUnit.SEC:
-                delay = self.settings.download_interval
-            elif self.settings.download_interval_unit == TimeUnit.MIN:
-                delay = self.settings.download_interval * 60
-            elif self.settings.download_interval_unit == TimeUnit.HOUR:
-                delay = self.settings.download_interval * 60 * 60
+        # the next download is scheduled when this one has finished, so
+        # its result can be taken into account
+        if not self._is_nm_connection_allowed():
+            # after resume download as soon as an allowed network is up,
+            # otherwise at the next interval
+            self._schedule_next_download()
+        elif not self._has_kerberos_ticket():
+            # download when a ticket appears, or at the next interval
+            self._waiting_for_ticket = True
+            self._schedule_next_download()
+        else:
+            # profiles with a connected subscription are notified about
+            # changes, but certificate refresh needs the periodic download
+            profiles = [
+                profile for profile in self.settings.profile_names
+                if not self._is_subscribed(profile)
+                or self.settings.snapshot.certificate_refresh_fraction > 0
+                ]
+            if profiles:
+                # catching up ends with a successful download, a failed
+                # one is retried when the network changes again
+                self._request_download(False, profiles)
             else:
-                return
-
-            self.download_thread = threading.Timer(delay, self._scheduled_download)
-            self.download_thread.start()
-
-    def _save_file(self, content, show_info):
-        config_dir = self.settings.download_destination.replace("~/", QDir.homePath() + "/")
-        if not os.path.exists(config_dir):
-            os.mkdir(config_dir)
-        fn = config_dir + "/OpenVPN_arachne.conf"
-        f = QFile(fn)
-        try:
-            with open(QFile.OpenModeFlag.WriteOnly, encoding="utf-8") as f:
-                f.write(content)
-                f.close()
-                if show_info:
-                    self._info(f"Configuration saved as {fn}")
-        except IOError as ex:
-            if show_info:
-                self._error(f"Cannot save {fn}: {str(ex)}")
-
-    def _update_networkmaneger_connection(self, con_data, show_info):
-        bus = dbus.SystemBus()
-        settings = bus.get_object(
-            "org.freedesktop.NetworkManager",
-            "/org/freedesktop/NetworkManager/Settings"
-            )
-        con_settings = {
-            "connection": {
-                "id": con_data["name"],
-                "type": "vpn",
-                "autoconnect": False,
-                "permissions": ["user:" + os.getlogin()]
-                },
-            "vpn": {
-                "service-type": "org.freedesktop.NetworkManager.openvpn",
-                "data": {
-                    "ca": self._ca_file_name,
-                    "cert": self._cert_file_name,
-                    "key": self._key_file_name
-                    } | { k: str(v) for k,v in con_data["data"].items() }
-                },
-            "ipv4": {
-                "never-default": con_data["ipv4"]["never-default"],
-                "method": "auto",
-                "dns-search": con_data["ipv4"]["dns-search"],
-                "dns": [
-                    dbus.types.UInt32(
-                        socket.htonl(netaddr.IPAddress(ip).value)
+                self.download_schedule.catching_up = False
+                self._schedule_next_download()
+
+    def _on_active_connections_changed(self):
+        if self.download_schedule.catching_up and not self._suspended:
+            self.download_timer.stop()
+            self._scheduled_download()
+
+    def _on_suspending(self):
+        self._suspended = True
+        self.download_timer.stop()
+        self.prefetch_timer.stop()
+        # running downloads finish before the system sleeps
+        if not self._downloads_running:
+            self._sleep_state.release()
+
+    def _on_resumed(self):
+        self._suspended = False
+        if self.settings.snapshot.auto_download:
+            # QTimer doesn't count the time the system sleeps
+            self._schedule_download(self.download_schedule.resume_delay())
+
+    def _is_subscribed(self, profile: str) -> bool:
+        subscription = self._subscriptions.get(profile)
+        return subscription is not None and subscription.connected
+
+    def _start_subscriptions(self):
+        if not self.settings.snapshot.subscribe_to_changes:
+            return
+        from .subscription import ConfigSubscription
+        for profile in self.settings.profile_names:
+            if profile not in self._subscriptions:
+                subscription = ConfigSubscription(
+                    self.settings.profile_settings(profile),
+                    self._config_changed.emit
                     )
-                    for ip in con_data["ipv4"]["dns"]
-                    ]
-                }
+                self._subscriptions[profile] = subscription
+                subscription.start()
+
+    def _stop_subscriptions(self):
+        for subscription in self._subscriptions.values():
+            subscription.stop()
+        self._subscriptions = {}
+
+    def _on_config_changed(self, profile: str):
+        if not self._is_nm_connection_allowed() or not self._has_kerberos_ticket():
+            return
+        self._request_download(False, [profile])
+
+    def _on_ticket_acquired(self):
+        if self._waiting_for_ticket:
+            self._waiting_for_ticket = False
+            self.download_timer.stop()
+            self._scheduled_download()
+
+    def _prefetch_service_tickets(self):
+        if not self._has_kerberos_ticket():
+            return
+        urls = {
+            self.settings.profile_settings(profile).snapshot.admin_server_url
+            for profile in self.settings.profile_names
             }
+        self._download_worker(0).request_prefetch(sorted(urls))
+
+    def _request_download(self, show_info, profiles=None):
+        # Only one download per profile at a time, a request while a
+        # profile's download is running is folded into the running one.
+        self._download_show_info = self._download_show_info or show_info
+        for index, profile in enumerate(self.settings.profile_names):
+            if profiles is not None and profile not in profiles:
+                continue
+            if profile in self._downloads_running:
+                continue
+            self._downloads_running.add(profile)
+            self._download_worker(index).request(profile)
+
+    def _on_download_info(self, msg):
+        if self._download_show_info:
+            self._info(msg)
+
+    def _on_download_error(self, msg):
+        if self._download_show_info:
+            self._error(msg)
+
+    def _on_download_finished(self, profile, ok, retry_after):
+        self._downloads_running.discard(profile)
+        self._cycle_ok = self._cycle_ok and ok
+        if retry_after >= 0:
+            self._cycle_retry_after = max(retry_after, self._cycle_retry_after or 0)
+        if not self._downloads_running:
+            self._download_show_info = False
+            if self._cycle_ok:
+                self.download_schedule.record_success()
+            else:
+                self.download_schedule.record_failure(self._cycle_retry_after)
+            self._cycle_ok = True
+            self._cycle_retry_after = None
+            if not self.download_timer.isActive():
+                self._schedule_next_download()
+            self._export_metrics()
+            self._start_subscriptions()
+            if self._suspended:
+                self.download_timer.stop()
+                self._sleep_state.release()
+            if self.settings.snapshot.low_memory:
+                self._release_workers()
+            memory_report.report("after download")
+        self.settings.sync()
+        self._update_status()
 
+    def _release_workers(self):
+        # Workers, their sessions and threads are created again by the
+        # next download
+        for worker in self._download_workers:
+            worker.stop()
+        self._download_workers = []
+        memory_report.trim()
+
+    def _export_metrics(self):
         try:
-            cur_obj_path = settings.GetConnectionByUuid(
-                self.settings.connection_uuid,
-                dbus_interface="org.freedesktop.NetworkManager.Settings"
-                )
-            cur_con = bus.get_object("org.freedesktop.NetworkManager", cur_obj_path)
-            cur_con.Update(
-                con_settings,
-                dbus_interface="org.freedesktop.NetworkManager.Settings.Connection"
-                )
-            if show_info:
-                self._info(f"Updaded connection '{con_data['name']}'")
-        except dbus.exceptions.DBusException:
-            new_con_obj_path = settings.AddConnection(
-                con_settings,
-                dbus_interface="org.freedesktop.NetworkManager.Settings"
-            )
-            new_con = bus.get_object("org.freedesktop.NetworkManager", new_con_obj_path)
-            new_settings = new_con.GetSettings(
-                dbus_interface="org.freedesktop.NetworkManager.Settings.Connection"
-                )
-            uuid = new_settings["connection"]["uuid"]
-            self.settings.connection_uuid = uuid
-            if show_info:
-                self._info(f"Added new connection '{con_data['name']}' with uuid ''{uuid}'")
-
-    def _save_certs(self, json_data):
-        home = QDir.home()
-        home.mkdir(".cert")
-        if "caCertFilename" in json_data["certificates"]:
-            self._ca_file_name = f"{home.absolutePath()}/.cert/{json_data['certificates']['caCertFilename']}"
-        else:
-            self._ca_file_name = f"{home.absolutePath()}/.cert/arachne-ca.crt"
-        if "userCertFilename" in json_data["certificates"]:
-            self._cert_file_name = f"{home.absolutePath()}/.cert/{json_data['certificates']['userCertFilename']}"
-        else:
-            self._cert_file_name = f"{home.absolutePath()}/.cert/arachne-cert.crt"
-        if "privateKeyFilename" in json_data["certificates"]:
-            self._key_file_name = f"{home.absolutePath()}/.cert/{json_data['certificates']['privateKeyFilename']}"
-        else:
-            self._key_file_name = f"{home.absolutePath()}/.cert/arachne-cert.key"
-
-        with open(self._ca_file_name,  "w", encoding="utf-8") as f:
-            f.write(json_data["certificates"]["caCert"])
-            f.close()
-        with open(self._cert_file_name, "w", encoding="utf-8") as f:
-            f.write(json_data["certificates"]["userCert"])
-            f.close()
-        with open(self._key_file_name, "w", encoding="utf-8") as f:
-            f.write(json_data["certificates"]["privateKey"])
-            f.close()
-        os.chmod(self._key_file_name, stat.S_IRUSR | stat.S_IWUSR)
-
-    def _on_download_now(self, show_info=True):
-        url = self.settings.admin_server_url + USER_CONFIG_API_PATH
-        if self.settings.download_type == DownloadType.NETWORK_MANAGER:
-            url += "?format=json"
-        try:
-            r = requests.get(
-                url,
-                auth=HTTPKerberosAuth(mutual_authentication=OPTIONAL),
-                timeout=6,
-                verify=(not self.settings.ignore_ssl_errors)
-                )
-            r.raise_for_status()
-            if self.settings.download_type == DownloadType.NETWORK_MANAGER:
-                json_data = r.json()
-                self._save_certs(json_data)
-                self._update_networkmaneger_connection(json_data, show_info)
-            elif self.settings.download_type == DownloadType.OVPN:
-                self._save_file(r.content, show_info)
-            self.settings.touch_last_successful_download()
-        except json.decoder.JSONDecodeError as ex:
-            if show_info:
-                self._error(f"Error parsing json: {str(ex)}")
-        except requests.exceptions.RequestException as ex:
-            if show_info:
-                self._error(f"Cannot download configuration from {url}: {str(ex)}")
-        self._update_status()
+            metrics.export(self.settings.status_file, self.settings.prometheus_file)
+        except OSError as ex:
+            print(f"Cannot write metrics: {str(ex)}", file=sys.stderr)
+
+    def _on_download_now(self):
+        if not self._has_kerberos_ticket():
+            self._waiting_for_ticket = True
+            self._error("No valid Kerberos ticket, the download starts when there is one")
+            return
+        self._request_download(True)
 
     def _on_settings(self):
-        dlg = SettingsDialog(QIcon(self.icon_pixmap))
+        if self._settings_dialog is not None:
+            self._settings_dialog.raise_()
+            self._settings_dialog.activateWindow()
+            return
+        from .settings_dialog import SettingsDialog
+        dlg = SettingsDialog(self.icons.icon(IconColor.GREEN))
         dlg.load_settings(self.settings)
-        if dlg.exec() == QDialog.DialogCode.Accepted:
-            dlg.save_settings(self.settings)
-            self.settings.sync()
+        self._settings_dialog = dlg
+        try:
+            accepted = dlg.exec() == QDialog.DialogCode.Accepted
+        finally:
+            self._settings_dialog = None
+        if accepted:
+            with self.settings.batch_update():
+                dlg.save_settings(self.settings)
+                self.settings.clear_cache_validators()
+            self.download_timer.stop()
+            # started again with the new settings after the next download
+            self._stop_subscriptions()
+            self.download_schedule.record_success()
+            self._schedule_next_download()
 
     def _on_open_arachne_configuration(self):
-        QDesktopServices.openUrl(QUrl(self.settings.admin_server_url))
+        QDesktopServices.openUrl(QUrl(self.settings.snapshot.admin_server_url))
 
     def _on_exit(self):
-        self.download_thread.cancel()
+        self.download_timer.stop()
+        self.prefetch_timer.stop()
+        self._stop_subscriptions()
+        for worker in self._download_workers:
+            worker.cancel()
+        for worker in self._download_workers:
+            worker.stop()
         self.quit()
 
     def _on_about_pyarachnecdl(self):
+        from .about_dialog import AboutDialog
         dlg = AboutDialog()
         dlg.exec()
 
-def main():
+    def run_command(self, command: str):
+        if command == "download":
+            self._on_download_now()
+        elif command == "settings":
+            self._on_settings()
+
+def _forward(command: str) -> int:
+    # the D-Bus connection needs an application object
+    _app = QCoreApplication(sys.argv)
+    from .instance_service import forward
+    if forward(command):
+        return 0
+    # running in another session, or not yet registered
+    print(
+        f"Arachne Config Downloader is already running (pid {single_instance.owner()})",
+        file=sys.stderr
+        )
+    return single_instance.EXIT_ALREADY_RUNNING
+
+def main(command: str = None):
+    # the lock keeps downloads of other sessions and headless instances
+    # from racing this one, it's released when the process exits
+    lock = single_instance.acquire()
+    if lock is None:
+        sys.exit(_forward(command))
     app = ArachneConfigDownloader()
+    if command is not None:
+        QTimer.singleShot(0, lambda: app.run_command(command))
+    QTimer.singleShot(0, startup_profile.report)
+    QTimer.singleShot(0, lambda: memory_report.report("after startup"))
     sys.exit(app.exec())
@@ -0,0 +1,103 @@
+"""
+Expiry of downloaded certificates, reads notAfter from PEM encoded X.509
+certificates without a crypto library
+"""
+
+import base64
+import calendar
+import re
+
+_PEM_CERT = re.compile(
+    r"-----BEGIN CERTIFICATE-----\s*(.+?)\s*-----END CERTIFICATE-----",
+    re.DOTALL
+    )
+
+_TAG_SEQUENCE = 0x30
+_TAG_VERSION = 0xA0
+_TAG_UTC_TIME = 0x17
+_TAG_GENERALIZED_TIME = 0x18
+
+def _read_tlv(der: bytes, pos: int) -> tuple:
+    """
+    Tag, start and end of the DER value at pos
+    """
+    if pos + 2 > len(der):
+        raise ValueError("Truncated DER value")
+    tag = der[pos]
+    length = der[pos + 1]
+    pos += 2
+    if length & 0x80:
+        num_bytes = length & 0x7F
+        if num_bytes == 0 or pos + num_bytes > len(der):
+            raise ValueError("Invalid DER length")
+        length = int.from_bytes(der[pos:pos + num_bytes], "big")
+        pos += num_bytes
+    if pos + length > len(der):
+        raise ValueError("Truncated DER value")
+    return tag, pos, pos + length
+
+def _parse_time(tag: int, value: bytes) -> int:
+    text = value.decode("ascii").rstrip("Z")
+    if tag == _TAG_UTC_TIME:
+        year = int(text[0:2])
+        text = str(2000 + year if year < 50 else 1900 + year) + text[2:]
+    elif tag != _TAG_GENERALIZED_TIME:
+        raise ValueError(f"Unexpected time tag {tag:#x}")
+    fields = [int(text[i:i + 2]) for i in range(4, 14, 2)]
+    return calendar.timegm((int(text[0:4]), *fields, 0, 0, 0))
+
+def der_validity(der: bytes) -> tuple:
+    """
+    notBefore and notAfter of a DER encoded certificate as timestamps
+    """
+    tag, pos, _ = _read_tlv(der, 0)
+    if tag != _TAG_SEQUENCE:
+        raise ValueError("Not a certificate")
+    # tbsCertificate
+    tag, pos, _ = _read_tlv(der, pos)
+    if tag != _TAG_SEQUENCE:
+        raise ValueError("Not a certificate")
+    tag, _, end = _read_tlv(der, pos)
+    if tag == _TAG_VERSION:
+        pos = end
+    # serialNumber, signature, issuer
+    for _ in range(3):
+        _, _, pos = _read_tlv(der, pos)
+    tag, pos, _ = _read_tlv(der, pos)
+    if tag != _TAG_SEQUENCE:
+        raise ValueError("No validity in certificate")
+    tag, start, end = _read_tlv(der, pos)
+    not_before = _parse_time(tag, der[start:end])
+    tag, start, end = _read_tlv(der, end)
+    not_after = _parse_time(tag, der[start:end])
+    return not_before, not_after
+
+def pem_validities(text: str) -> list:
+    """
+    (notBefore, notAfter) of all certificates in text, certificates that
+    cannot be parsed are skipped
+    """
+    validities = []
+    for match in _PEM_CERT.finditer(text):
+        try:
+            der = base64.b64decode(match.group(1))
+            validities.append(der_validity(der))
+        except (ValueError, IndexError):
+            pass
+    return validities
+
+def files_expiry(file_names) -> int:
+    """
+    Earliest notAfter of the certificates in the files, -1 if there is none
+    """
+    expiry = -1
+    for fn in file_names:
+        try:
+            with open(fn, encoding="utf-8", errors="replace") as f:
+                validities = pem_validities(f.read())
+        except OSError:
+            continue
+        for _, not_after in validities:
+            if expiry == -1 or not_after < expiry:
+                expiry = not_after
+    return expiry
@@ -0,0 +1,82 @@
+"""
+Command line entry point, keeps imports to a minimum until the mode is known
+"""
+
+import argparse
+import sys
+
+from . import startup_profile
+from . import memory_report
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="pyarachnecdl",
+        description="Arachne Config Downloader"
+        )
+    parser.add_argument(
+        "--startup-profile",
+        action="store_true",
+        help="print import and initialisation times after startup"
+        )
+    parser.add_argument(
+        "--memory-report",
+        action="store_true",
+        help="trace allocations and print memory usage after startup and each download"
+        )
+    headless = parser.add_mutually_exclusive_group()
+    headless.add_argument(
+        "--once",
+        action="store_true",
+        help="download the configuration once without GUI and exit"
+        )
+    headless.add_argument(
+        "--daemon",
+        action="store_true",
+        help="download the configuration periodically without GUI"
+        )
+    command = parser.add_mutually_exclusive_group()
+    command.add_argument(
+        "--download-now",
+        dest="command",
+        action="store_const",
+        const="download",
+        help="download now, in the already running instance if there is one"
+        )
+    command.add_argument(
+        "--settings",
+        dest="command",
+        action="store_const",
+        const="settings",
+        help="open the settings dialog, in the already running instance if there is one"
+        )
+    parser.add_argument(
+        "--config",
+        default=None,
+        help="configuration file for --once and --daemon"
+        )
+    parser.add_argument(
+        "--state",
+        default=None,
+        help="state file for --once and --daemon"
+        )
+    args, _ = parser.parse_known_args()
+
+    if args.startup_profile:
+        startup_profile.enable()
+    if args.memory_report:
+        memory_report.enable()
+
+    if args.once or args.daemon:
+        from . import headless
+        from .plain_settings import DEFAULT_CONFIG_FILE, DEFAULT_STATE_FILE
+        startup_profile.mark("import headless")
+        startup_profile.report()
+        sys.exit(headless.main(
+            args.config or DEFAULT_CONFIG_FILE,
+            args.state or DEFAULT_STATE_FILE,
+            args.daemon
+            ))
+
+    from .arachne_config_downloader import main as gui_main
+    startup_profile.mark("import application")
+    gui_main(args.command)
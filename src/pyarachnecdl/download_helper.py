@@ -0,0 +1,49 @@
+"""
+Download one profile in a short living process, started by DownloadWorker
+
+    python -m pyarachnecdl.download_helper <organization> <application> <profile>
+
+Messages and the result are written to stdout as JSON lines.
+"""
+
+import json
+import sys
+
+from PyQt6.QtCore import QCoreApplication
+
+from .downloader import Downloader
+from .metrics import metrics
+from .settings import Settings
+
+def _send(**msg):
+    print(json.dumps(msg), flush=True)
+
+def main() -> int:
+    organization, application, profile = sys.argv[1:4]
+    # QSettings finds the tray application's settings by these names
+    app = QCoreApplication(sys.argv[:1])
+    app.setOrganizationName(organization)
+    app.setApplicationName(application)
+
+    settings = Settings(profile)
+    downloader = Downloader(
+        lambda msg: _send(info=msg),
+        lambda msg: _send(error=msg)
+        )
+    ok = False
+    try:
+        ok = downloader.download(settings, True)
+    finally:
+        settings.sync()
+        downloader.close()
+        trace = metrics.last(profile)
+        _send(
+            ok=ok,
+            retry_after=downloader.retry_after,
+            result=trace.result if trace else None,
+            phases=trace.phases if trace else {}
+            )
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+import json
+import subprocess
+import sys
+
+from PyQt6.QtCore import (
+    QCoreApplication,
+    QObject,
+    QThread,
+    pyqtSignal,
+    pyqtSlot
+    )
+
+from .settings import Settings
+from .metrics import metrics, DownloadTrace
+
+class DownloadWorker(QObject):
+    """
+    Runs downloads in its own thread and reports back via signals
+    """
+    info = pyqtSignal(str)
+    error = pyqtSignal(str)
+    # profile, success, Retry-After in seconds or -1
+    finished = pyqtSignal(str, bool, float)
+    _requested = pyqtSignal(str)
+    _prefetch_requested = pyqtSignal(list)
+
+    def __init__(self, name: str = "DownloadWorker"):
+        super().__init__()
+        self._thread = QThread()
+        self._thread.setObjectName(name)
+        # requests, Kerberos and D-Bus are imported in the worker thread
+        # on the first download
+        self._downloader = None
+        self._helper = None
+        self._profile = ""
+        self.moveToThread(self._thread)
+        self._requested.connect(self.download)
+        self._prefetch_requested.connect(self.prefetch_service_tickets)
+        self._thread.start()
+
+    def request(self, profile: str):
+        """
+        Queue a download of profile, runs in the worker's thread
+        """
+        self._requested.emit(profile)
+
+    def request_prefetch(self, urls: list):
+        """
+        Queue acquiring the service tickets for the admin servers' urls
+        """
+        self._prefetch_requested.emit(urls)
+
+    def _emit_info(self, msg: str):
+        self.info.emit(f"{self._profile}: {msg}" if self._profile else msg)
+
+    def _emit_error(self, msg: str):
+        self.error.emit(f"{self._profile}: {msg}" if self._profile else msg)
+
+    def _download_in_helper(self, profile: str) -> tuple:
+        app = QCoreApplication.instance()
+        self._helper = subprocess.Popen(
+            [
+                sys.executable, "-m", "pyarachnecdl.download_helper",
+                app.organizationName(), app.applicationName(), profile
+                ],
+            stdout=subprocess.PIPE,
+            text=True
+            )
+        ok = False
+        retry_after = None
+        try:
+            for line in self._helper.stdout:
+                try:
+                    msg = json.loads(line)
+                except ValueError:
+                    continue
+                if "info" in msg:
+                    self._emit_info(msg["info"])
+                elif "error" in msg:
+                    self._emit_error(msg["error"])
+                elif "ok" in msg:
+                    ok = msg["ok"]
+                    retry_after = msg["retry_after"]
+                    if msg["result"] is not None:
+                        trace = DownloadTrace(profile)
+                        trace.result = msg["result"]
+                        trace.phases = msg["phases"]
+                        metrics.record(trace)
+        finally:
+            self._helper.stdout.close()
+            self._helper.wait()
+            self._helper = None
+        return ok, retry_after
+
+    @pyqtSlot(str)
+    def download(self, profile: str):
+        self._profile = profile
+        # QSettings must not be shared between threads, each thread
+        # needs its own object. Changes are visible to all of them.
+        settings = Settings(profile)
+        ok = False
+        retry_after = None
+        try:
+            if settings.snapshot.download_in_helper:
+                ok, retry_after = self._download_in_helper(profile)
+            else:
+                if self._downloader is None:
+                    from .downloader import Downloader
+                    self._downloader = Downloader(self._emit_info, self._emit_error)
+                ok = self._downloader.download(settings, True)
+                retry_after = self._downloader.retry_after
+        except Exception as ex:
+            # an exception escaping a slot aborts the application
+            # pylint: disable=broad-exception-caught
+            self._emit_error(f"Download failed: {type(ex).__name__}: {str(ex)}")
+        finally:
+            settings.sync()
+            self.finished.emit(profile, ok, -1.0 if retry_after is None else retry_after)
+
+    @pyqtSlot(list)
+    def prefetch_service_tickets(self, urls: list):
+        from . import kerberos_ticket
+        for url in urls:
+            kerberos_ticket.prefetch_service_ticket(url)
+
+    def cancel(self):
+        if self._downloader is not None:
+            self._downloader.cancel()
+        helper = self._helper
+        if helper is not None:
+            helper.terminate()
+
+    def stop(self):
+        self.cancel()
+        self._thread.quit()
+        self._thread.wait()
+        if self._downloader is not None:
+            self._downloader.close()
@@ -0,0 +1,391 @@
+"""
+Download user configuration from Arachne server
+"""
+
+import getpass
+import hashlib
+import os
+import json
+import socket
+import stat
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+import netaddr
+import requests
+
+import dbus
+
+from .settings_types import DownloadType
+from .file_store import FileStore
+from .certificates import files_expiry
+from .metrics import metrics, phase
+from .transport import new_session, set_dns_cache_time
+from .scheduler import parse_retry_after
+from . import resolver
+from . import server_selection
+from . import network_manager_connection as nm
+
+USER_CONFIG_API_PATH = "/api/openvpn/user_config"
+CHUNK_SIZE = 16 * 1024
+
+class DownloadTooLargeError(Exception):
+    pass
+
+class DownloadCancelledError(Exception):
+    pass
+
+class DownloadTimeoutError(Exception):
+    pass
+
+class Downloader:
+    """
+    Long living downloader, keeps one HTTP session for all downloads.
+
+    The session keeps the keep-alive connection to the admin server and
+    the session cookie set by the server after the first Negotiate
+    exchange, so subsequent downloads don't need the 401 round trip.
+    """
+    def __init__(self, info, error):
+        self._info = info
+        self._error = error
+        self._session = None
+        self._cancelled = threading.Event()
+        self._deadline = None
+        # Retry-After of the last download if the server was busy
+        self.retry_after = None
+
+    @property
+    def session(self) -> requests.Session:
+        if self._session is None:
+            self._session = new_session()
+        return self._session
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def _iter_body(self, r: requests.Response, max_size: int):
+        content_length = r.headers.get("Content-Length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > max_size:
+            raise DownloadTooLargeError(
+                f"Response has {content_length} bytes, more than the allowed {max_size} bytes"
+                )
+        size = 0
+        for chunk in r.iter_content(CHUNK_SIZE):
+            if self._cancelled.is_set():
+                raise DownloadCancelledError()
+            if self._deadline is not None and time.monotonic() > self._deadline:
+                raise DownloadTimeoutError("Download takes too long")
+            size += len(chunk)
+            if size > max_size:
+                raise DownloadTooLargeError(f"Response exceeds {max_size} bytes")
+            yield chunk
+
+    def _read_body(self, r: requests.Response, max_size: int) -> tuple:
+        with phase("transfer"):
+            content = b"".join(self._iter_body(r, max_size))
+        return content, hashlib.sha256(content).hexdigest()
+
+    def _stream_file(self, settings, r: requests.Response, store: FileStore) -> str:
+        fn = self._ovpn_file_name(settings)
+        os.makedirs(os.path.dirname(fn), exist_ok=True)
+        digest = hashlib.sha256()
+        # the configuration contains the private key
+        with phase("transfer"), store.create_temp(fn, stat.S_IRUSR | stat.S_IWUSR) as f:
+            for chunk in self._iter_body(r, settings.max_download_size):
+                digest.update(chunk)
+                f.write(chunk)
+        return digest.hexdigest()
+
+    def _update_networkmaneger_connection(self, settings, con_data, show_info):
+        ca_file_name, cert_file_name, key_file_name = settings.cert_files
+        con_settings = {
+            "connection": {
+                "id": con_data["name"],
+                "type": "vpn",
+                "autoconnect": False,
+                "permissions": ["user:" + getpass.getuser()]
+                },
+            "vpn": {
+                "service-type": "org.freedesktop.NetworkManager.openvpn",
+                "data": {
+                    "ca": ca_file_name,
+                    "cert": cert_file_name,
+                    "key": key_file_name
+                    } | { k: str(v) for k,v in con_data["data"].items() }
+                },
+            "ipv4": {
+                "never-default": con_data["ipv4"]["never-default"],
+                "method": "auto",
+                "dns-search": con_data["ipv4"]["dns-search"],
+                "dns": [
+                    dbus.types.UInt32(
+                        socket.htonl(netaddr.IPAddress(ip).value)
+                    )
+                    for ip in con_data["ipv4"]["dns"]
+                    ]
+                }
+            }
+
+        in_memory = settings.store_connection_in_memory
+        try:
+            with phase("nm_lookup"):
+                cur_obj_path, cur_settings = nm.get_connection_settings(settings.connection_uuid)
+        except dbus.exceptions.DBusException:
+            con_settings["connection"]["uuid"] = str(uuid.uuid4())
+            with phase("nm_add"):
+                nm.add_connection(con_settings, in_memory)
+            settings.connection_uuid = con_settings["connection"]["uuid"]
+            if show_info:
+                self._info(
+                    f"Added new connection '{con_data['name']}' with uuid '{settings.connection_uuid}'"
+                    )
+            return
+
+        # Update makes NetworkManager write the connection and emit
+        # signals, skip it if nothing has changed
+        changed = nm.changed_sections(cur_settings, con_settings)
+        if not changed:
+            if show_info:
+                self._info(f"Connection '{con_data['name']}' is up to date")
+            return
+        with phase("nm_update"):
+            nm.update_connection(
+                cur_obj_path,
+                nm.merge_settings(cur_settings, con_settings, changed),
+                in_memory
+                )
+        if show_info:
+            self._info(f"Updaded connection '{con_data['name']}'")
+
+    def _cert_file_names(self, settings, certs: dict) -> tuple:
+        cert_dir = os.path.expanduser("~/.cert")
+        prefix = f"arachne-{settings.profile}" if settings.profile else "arachne"
+        names = []
+        for configured, key, default in (
+                (settings.ca_cert_filename, "caCertFilename", f"{prefix}-ca.crt"),
+                (settings.user_cert_filename, "userCertFilename", f"{prefix}-cert.crt"),
+                (settings.private_key_filename, "privateKeyFilename", f"{prefix}-cert.key")
+                ):
+            name = configured or default
+            if not configured and certs.get(key):
+                # Named profiles may use different servers that send the
+                # same names, keep their files apart
+                name = os.path.basename(certs[key])
+                if settings.profile:
+                    name = f"{prefix}-{name}"
+            names.append(f"{cert_dir}/{name}")
+        return tuple(names)
+
+    @staticmethod
+    def _ovpn_file_name(settings) -> str:
+        config_dir = os.path.expanduser(settings.download_destination)
+        if settings.profile:
+            return f"{config_dir}/OpenVPN_arachne-{settings.profile}.conf"
+        return f"{config_dir}/OpenVPN_arachne.conf"
+
+    def _save_certs(self, settings, json_data) -> None:
+        os.makedirs(os.path.expanduser("~/.cert"), exist_ok=True)
+        ca_file_name, cert_file_name, key_file_name = self._cert_file_names(
+            settings,
+            json_data["certificates"]
+            )
+
+        certs = json_data["certificates"]
+        store = FileStore()
+        try:
+            store.stage(ca_file_name, certs["caCert"])
+            store.stage(cert_file_name, certs["userCert"])
+            store.stage(key_file_name, certs["privateKey"], stat.S_IRUSR | stat.S_IWUSR)
+            store.commit()
+        except BaseException:
+            store.discard()
+            raise
+        # kept in the settings, a new Downloader or process sends a
+        # conditional request too
+        cert_files = (ca_file_name, cert_file_name, key_file_name)
+        if settings.cert_files != cert_files:
+            settings.cert_files = cert_files
+
+    @staticmethod
+    def _preflight(settings, url: str):
+        """
+        Resolve the admin server's name through the cache, an unknown
+        host fails here without waiting for a connection
+        """
+        if requests.utils.get_environ_proxies(url):
+            # the proxy resolves the name
+            return
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        with phase("dns"):
+            resolver.resolve(parts.hostname, port, settings.dns_cache_time)
+
+    def _request(self, settings, path: str, headers: dict) -> requests.Response:
+        """
+        GET path from the first admin server that accepts the connection
+        """
+        servers = server_selection.ServerList.from_settings(settings).candidates()
+        for i, base_url in enumerate(servers):
+            url = base_url + path
+            start = time.monotonic()
+            try:
+                self._preflight(settings, url)
+                with phase("request"):
+                    r = self.session.get(
+                        url,
+                        headers=headers,
+                        timeout=(settings.connect_timeout, settings.read_timeout),
+                        verify=(not settings.ignore_ssl_errors),
+                        stream=True
+                        )
+            except (requests.exceptions.ConnectionError, socket.gaierror):
+                server_selection.record_failure(base_url)
+                if i == len(servers) - 1 or time.monotonic() > self._deadline:
+                    raise
+                continue
+            server_selection.record_success(base_url, time.monotonic() - start)
+            return r
+        raise requests.exceptions.RequestException("No admin server to download from")
+
+    def _update_certificate_expiry(self, settings, dl_type: DownloadType):
+        if dl_type == DownloadType.OVPN:
+            # the certificates are inline
+            file_names = [self._ovpn_file_name(settings)]
+        else:
+            # CA and user certificate, not the private key
+            file_names = settings.cert_files[:2]
+        expiry = files_expiry(file_names)
+        if expiry != settings.certificate_expiry:
+            settings.certificate_expiry = expiry
+
+    def _is_download_applied(self, settings, dl_type: DownloadType) -> bool:
+        if dl_type == DownloadType.OVPN:
+            return os.path.exists(self._ovpn_file_name(settings))
+        if dl_type == DownloadType.NETWORK_MANAGER:
+            cert_files = settings.cert_files
+            if not cert_files or not settings.connection_uuid:
+                return False
+            try:
+                with phase("nm_lookup"):
+                    nm.get_connection_by_uuid(settings.connection_uuid)
+            except dbus.exceptions.DBusException:
+                return False
+            return all(os.path.exists(fn) for fn in cert_files)
+        return False
+
+    def download(self, settings, show_info=True) -> bool:
+        self._cancelled.clear()
+        self.retry_after = None
+        trace = metrics.begin(settings.profile)
+        result = "failed"
+        dl_type = settings.download_type
+        path = USER_CONFIG_API_PATH
+        if dl_type == DownloadType.NETWORK_MANAGER:
+            path += "?format=json"
+        url = settings.admin_server_url + path
+
+        headers = {}
+        etag, last_modified, digest = settings.cache_validators(dl_type)
+        if digest and self._is_download_applied(settings, dl_type):
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+        else:
+            digest = ""
+
+        store = FileStore()
+        # the body of a NetworkManager download
+        content = None
+        self._deadline = time.monotonic() + settings.total_timeout
+        set_dns_cache_time(self.session, settings.dns_cache_time)
+        try:
+            r = self._request(settings, path, headers)
+            url = r.url
+            with r:
+                if r.status_code in (
+                        requests.codes.too_many_requests,
+                        requests.codes.service_unavailable
+                        ):
+                    self.retry_after = parse_retry_after(r.headers.get("Retry-After"))
+                r.raise_for_status()
+                if r.status_code == requests.codes.not_modified:
+                    if not headers:
+                        # only a conditional request may be answered
+                        # with 304, e.g. by a misbehaving proxy
+                        raise requests.exceptions.HTTPError(
+                            f"Unexpected status {r.status_code} {r.reason}",
+                            response=r
+                            )
+                    new_digest = digest
+                elif dl_type == DownloadType.OVPN:
+                    new_digest = self._stream_file(settings, r, store)
+                else:
+                    content, new_digest = self._read_body(r, settings.max_download_size)
+
+            if self._cancelled.is_set():
+                raise DownloadCancelledError()
+            if digest and new_digest == digest:
+                if show_info:
+                    self._info("Configuration is up to date")
+                result = "unchanged"
+            else:
+                if dl_type == DownloadType.NETWORK_MANAGER:
+                    with phase("parse"):
+                        json_data = json.loads(content)
+                    with phase("write"):
+                        self._save_certs(settings, json_data)
+                    self._update_networkmaneger_connection(settings, json_data, show_info)
+                elif dl_type == DownloadType.OVPN:
+                    with phase("write"):
+                        store.commit()
+                    if show_info:
+                        self._info(f"Configuration saved as {self._ovpn_file_name(settings)}")
+                settings.set_cache_validators(
+                    dl_type,
+                    r.headers.get("ETag", ""),
+                    r.headers.get("Last-Modified", ""),
+                    new_digest
+                    )
+                result = "updated"
+            if result == "updated" or settings.certificate_expiry == -1:
+                self._update_certificate_expiry(settings, dl_type)
+            settings.touch_last_successful_download()
+            return True
+        except DownloadCancelledError:
+            result = "cancelled"
+        except (DownloadTooLargeError, DownloadTimeoutError) as ex:
+            if show_info:
+                self._error(f"Cannot download configuration from {url}: {str(ex)}")
+        except json.decoder.JSONDecodeError as ex:
+            if show_info:
+                self._error(f"Error parsing json: {str(ex)}")
+        except (KeyError, TypeError, ValueError, netaddr.AddrFormatError) as ex:
+            # a json body that isn't the expected configuration
+            if show_info:
+                self._error(f"Invalid configuration from {url}: {type(ex).__name__}: {str(ex)}")
+        except dbus.exceptions.DBusException as ex:
+            if show_info:
+                self._error(f"Cannot update NetworkManager connection: {str(ex)}")
+        except requests.exceptions.RequestException as ex:
+            if show_info:
+                self._error(f"Cannot download configuration from {url}: {str(ex)}")
+        except socket.gaierror as ex:
+            result = "unreachable"
+            if show_info:
+                self._error(f"Cannot download configuration from {url}: {str(ex)}")
+        except OSError as ex:
+            if show_info:
+                self._error(f"Cannot save configuration: {str(ex)}")
+        finally:
+            store.discard()
+            metrics.end(trace, result)
+        return False
@@ -0,0 +1,69 @@
+"""
+Incremental parser for server-sent events (text/event-stream)
+"""
+
+import re
+
+_LINE_END = re.compile(rb"\r\n|\r|\n")
+# a server that sends no line end isn't an event stream
+MAX_LINE_LENGTH = 64 * 1024
+
+class EventStreamParser:
+    """
+    Fed with the body as it arrives, returns the types of the completed
+    events. Events without data aren't dispatched, like in browsers.
+    """
+    def __init__(self):
+        self.last_event_id = None
+        # reconnection time in milliseconds sent by the server
+        self.retry = None
+        self.data = None
+        self._buffer = b""
+        self._event_type = ""
+        self._data = []
+
+    def feed(self, chunk: bytes) -> list:
+        self._buffer += chunk
+        events = []
+        pos = 0
+        while True:
+            match = _LINE_END.search(self._buffer, pos)
+            if match is None:
+                break
+            if match.group() == b"\r" and match.end() == len(self._buffer):
+                # may be the first half of \r\n
+                break
+            event_type = self._line(self._buffer[pos:match.start()].decode("utf-8", errors="replace"))
+            if event_type is not None:
+                events.append(event_type)
+            pos = match.end()
+        self._buffer = self._buffer[pos:]
+        if len(self._buffer) > MAX_LINE_LENGTH:
+            raise ValueError("Event stream line too long")
+        return events
+
+    def _line(self, line: str) -> str:
+        if not line:
+            event_type = self._event_type or "message"
+            data = self._data
+            self._event_type = ""
+            self._data = []
+            if not data:
+                return None
+            self.data = "\n".join(data)
+            return event_type
+        if line.startswith(":"):
+            # comment, used as heartbeat
+            return None
+        field, sep, value = line.partition(":")
+        if sep:
+            value = value.removeprefix(" ")
+        if field == "event":
+            self._event_type = value
+        elif field == "data":
+            self._data.append(value)
+        elif field == "id" and "\0" not in value:
+            self.last_event_id = value
+        elif field == "retry" and value.isdigit():
+            self.retry = int(value)
+        return None
@@ -0,0 +1,94 @@
+"""
+Atomic, write-if-changed file storage for downloaded certificates and configs
+"""
+
+import hashlib
+import os
+import tempfile
+
+def file_digest(path: str) -> str:
+    try:
+        with open(path, "rb") as f:
+            return hashlib.file_digest(f, "sha256").hexdigest()
+    except OSError:
+        return None
+
+class _SyncedFile:
+    def __init__(self, fd: int):
+        self._file = os.fdopen(fd, "wb")
+
+    def write(self, data: bytes):
+        self._file.write(data)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+        finally:
+            self._file.close()
+
+class FileStore:
+    """
+    Writes a set of files as one unit: unchanged files are skipped, changed
+    files are written to temporary files with their final mode, synced and
+    then renamed into place one after another.
+    """
+    def __init__(self):
+        self._staged = []
+
+    def stage(self, path: str, content: bytes, mode: int = 0o644):
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        if file_digest(path) == hashlib.sha256(content).hexdigest():
+            return
+
+        with self.create_temp(path, mode) as f:
+            f.write(content)
+
+    def create_temp(self, path: str, mode: int = 0o644):
+        """
+        Open a temporary file with the given mode that replaces path on
+        commit. The file is synced when it's closed.
+        """
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(path),
+            prefix=f".{os.path.basename(path)}."
+            )
+        self._staged.append((tmp_path, path))
+        try:
+            os.fchmod(fd, mode)
+        except OSError:
+            os.close(fd)
+            raise
+        return _SyncedFile(fd)
+
+    def discard(self):
+        for tmp_path, _ in self._staged:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+        self._staged = []
+
+    def commit(self) -> bool:
+        """
+        Move all staged files into place, returns False if nothing changed
+        """
+        if not self._staged:
+            return False
+        dirs = set()
+        for tmp_path, path in self._staged:
+            os.replace(tmp_path, path)
+            dirs.add(os.path.dirname(path))
+        self._staged = []
+        for dir_name in dirs:
+            fd = os.open(dir_name, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        return True
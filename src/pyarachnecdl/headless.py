@@ -0,0 +1,220 @@
+"""
+Download without Qt, once or periodically as daemon
+"""
+
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .downloader import Downloader
+from .plain_settings import PlainSettings
+from .settings_types import MAX_DOWNLOAD_WORKERS
+from .scheduler import DownloadSchedule
+from .metrics import metrics
+from . import network_manager_connection
+from . import kerberos_ticket
+from . import memory_report
+from . import single_instance
+
+# seconds between checks for a Kerberos ticket
+TICKET_POLL_INTERVAL = 30
+# Event.wait() doesn't count the time the system sleeps, the wall clock
+# is checked at least this often to notice an overdue download
+RESUME_CHECK_INTERVAL = 60
+# seconds between checks for an allowed network after resume
+NETWORK_POLL_INTERVAL = 15
+
+def _print_info(profile: str):
+    def info(msg):
+        print(f"{profile}: {msg}" if profile else msg, flush=True)
+    return info
+
+def _print_error(profile: str):
+    def error(msg):
+        print(f"{profile}: {msg}" if profile else msg, file=sys.stderr, flush=True)
+    return error
+
+class HeadlessDownloader:
+    def __init__(self, settings):
+        self._settings = settings
+        self._downloaders = {}
+        self._stop = threading.Event()
+        # set by stop() and by subscriptions' notifications
+        self._wakeup = threading.Event()
+        self._subscriptions = {}
+        self._notified = set()
+        self._lock = threading.Lock()
+
+    def _downloader(self, profile: str) -> Downloader:
+        if profile not in self._downloaders:
+            self._downloaders[profile] = Downloader(_print_info(profile), _print_error(profile))
+        return self._downloaders[profile]
+
+    def _download(self, profile: str) -> bool:
+        return self._downloader(profile).download(
+            self._settings.profile_settings(profile),
+            True
+            )
+
+    def download_all(self, profiles: list = None) -> bool:
+        if profiles is None:
+            profiles = self._settings.profile_names
+        for profile in profiles:
+            self._downloader(profile)
+        with ThreadPoolExecutor(max_workers=min(len(profiles), MAX_DOWNLOAD_WORKERS)) as executor:
+            results = list(executor.map(self._download, profiles))
+        self._settings.sync()
+        try:
+            metrics.export(self._settings.status_file, self._settings.prometheus_file)
+        except OSError as ex:
+            print(f"Cannot write metrics: {str(ex)}", file=sys.stderr, flush=True)
+        if self._settings.snapshot.low_memory:
+            self.release()
+        memory_report.report("after download")
+        return all(results)
+
+    def release(self):
+        for downloader in self._downloaders.values():
+            downloader.close()
+        memory_report.trim()
+
+    def is_download_allowed(self) -> bool:
+        vpn_uuids = [
+            self._settings.profile_settings(profile).connection_uuid
+            for profile in self._settings.profile_names
+            ]
+        return network_manager_connection.is_download_allowed(
+            self._settings.snapshot,
+            network_manager_connection.get_active_types(),
+            vpn_uuids
+            )
+
+    def has_kerberos_ticket(self) -> bool:
+        if not self._settings.snapshot.require_kerberos_ticket:
+            return True
+        lifetime = kerberos_ticket.tgt_lifetime()
+        return lifetime is None or lifetime > 0
+
+    def certificate_expiry(self) -> int:
+        expiries = [
+            self._settings.profile_settings(profile).certificate_expiry
+            for profile in self._settings.profile_names
+            ]
+        return min((e for e in expiries if e != -1), default=-1)
+
+    def stop(self, *_args):
+        self._stop.set()
+        self._wakeup.set()
+        for subscription in self._subscriptions.values():
+            subscription.stop()
+        for downloader in self._downloaders.values():
+            downloader.cancel()
+
+    def _start_subscriptions(self):
+        if not self._settings.snapshot.subscribe_to_changes or self._subscriptions:
+            return
+        from .subscription import ConfigSubscription
+        for profile in self._settings.profile_names:
+            subscription = ConfigSubscription(
+                self._settings.profile_settings(profile),
+                self._on_config_changed
+                )
+            self._subscriptions[profile] = subscription
+            subscription.start()
+
+    def _on_config_changed(self, profile: str):
+        with self._lock:
+            self._notified.add(profile)
+        self._wakeup.set()
+
+    def _polled_profiles(self) -> list:
+        # profiles with a connected subscription are notified about
+        # changes, but certificate refresh needs the periodic download
+        if self._settings.snapshot.certificate_refresh_fraction > 0:
+            return self._settings.profile_names
+        return [
+            profile for profile in self._settings.profile_names
+            if profile not in self._subscriptions
+            or not self._subscriptions[profile].connected
+            ]
+
+    def run_daemon(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        schedule = DownloadSchedule()
+        delay = schedule.first_delay(self._settings.snapshot)
+        next_at = time.time() + delay if delay is not None else None
+        catching_up = False
+        while not self._stop.is_set():
+            timeout = None
+            if next_at is not None:
+                timeout = min(max(0, next_at - time.time()), RESUME_CHECK_INTERVAL)
+            wall_start, monotonic_start = time.time(), time.monotonic()
+            self._wakeup.wait(timeout)
+            if self._stop.is_set():
+                break
+            self._wakeup.clear()
+            if (time.time() - wall_start) - (time.monotonic() - monotonic_start) > RESUME_CHECK_INTERVAL:
+                # the system has been sleeping
+                catching_up = catching_up or (next_at is not None and time.time() >= next_at)
+            with self._lock:
+                notified = self._notified
+                self._notified = set()
+            periodic = next_at is not None and time.time() >= next_at
+
+            if not self.has_kerberos_ticket():
+                # download as soon as there's a ticket
+                with self._lock:
+                    self._notified |= notified
+                if periodic:
+                    next_at = time.time() + TICKET_POLL_INTERVAL
+                continue
+            if not periodic:
+                if notified and self.is_download_allowed():
+                    self.download_all(sorted(notified))
+                continue
+
+            allowed = self.is_download_allowed()
+            if catching_up and not allowed:
+                # after resume download as soon as an allowed network is up
+                with self._lock:
+                    self._notified |= notified
+                next_at = time.time() + NETWORK_POLL_INTERVAL
+                continue
+            catching_up = False
+            profiles = sorted(set(self._polled_profiles()) | notified)
+            if profiles and allowed:
+                if self.download_all(profiles):
+                    schedule.record_success()
+                else:
+                    retry_after = [
+                        d.retry_after for d in self._downloaders.values()
+                        if d.retry_after is not None
+                        ]
+                    schedule.record_failure(max(retry_after) if retry_after else None)
+                self._start_subscriptions()
+            delay = schedule.next_delay(self._settings.snapshot, self.certificate_expiry())
+            next_at = time.time() + delay if delay is not None else None
+
+        for downloader in self._downloaders.values():
+            downloader.close()
+
+def main(config_file: str, state_file: str, daemon: bool) -> int:
+    lock = single_instance.acquire()
+    if lock is None:
+        print(
+            f"Another instance is running (pid {single_instance.owner()}), not downloading",
+            file=sys.stderr
+            )
+        return single_instance.EXIT_ALREADY_RUNNING
+    headless = HeadlessDownloader(PlainSettings(config_file, state_file))
+    if daemon:
+        headless.run_daemon()
+        return 0
+    if not headless.has_kerberos_ticket():
+        print("No valid Kerberos ticket, run kinit first", file=sys.stderr)
+        return 1
+    return 0 if headless.download_all() else 1
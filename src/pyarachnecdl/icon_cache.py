@@ -0,0 +1,31 @@
+"""
+Status icons, loaded on first use
+"""
+
+from enum import StrEnum
+import importlib.resources
+
+from PyQt6.QtGui import QIcon
+
+import pyarachnecdl.data
+
+class IconColor(StrEnum):
+    BLUE = "blue"
+    GREEN = "green"
+    RED = "red"
+    YELLOW = "yellow"
+
+class IconCache:
+    """
+    Creates an icon only when it's used
+    """
+    def __init__(self):
+        self._data_dir = importlib.resources.files(pyarachnecdl.data)
+        self._icons = {}
+
+    def icon(self, color: IconColor) -> QIcon:
+        icon = self._icons.get(color)
+        if icon is None:
+            icon = QIcon(str(self._data_dir / f"arachne-{color}.svg"))
+            self._icons[color] = icon
+        return icon
@@ -0,0 +1,76 @@
+from PyQt6.QtCore import (
+    QObject,
+    QTimer,
+    pyqtClassInfo,
+    pyqtSignal,
+    pyqtSlot
+    )
+from PyQt6.QtDBus import (
+    QDBusConnection,
+    QDBusMessage
+    )
+
+SERVICE_NAME = "at.nieslony.pyarachnecdl"
+OBJECT_PATH = "/at/nieslony/pyarachnecdl"
+INTERFACE = "at.nieslony.pyarachnecdl.Application"
+
+# command line commands and the D-Bus methods they call
+COMMANDS = {
+    "download": "DownloadNow",
+    "settings": "OpenSettings",
+    }
+
+@pyqtClassInfo("D-Bus Interface", INTERFACE)
+class InstanceService(QObject):
+    """
+    Session bus service of the running instance, later started instances
+    pass their command to it and exit. The signals are emitted after the
+    reply has been sent, the settings dialog runs modal and the caller
+    would wait for it to be closed.
+    """
+    download_now_requested = pyqtSignal()
+    settings_requested = pyqtSignal()
+
+    def register(self) -> bool:
+        bus = QDBusConnection.sessionBus()
+        if not bus.isConnected() or not bus.registerService(SERVICE_NAME):
+            return False
+        return bus.registerObject(
+            OBJECT_PATH,
+            self,
+            QDBusConnection.RegisterOption.ExportAllSlots
+            )
+
+    @pyqtSlot()
+    def DownloadNow(self):
+        # pylint: disable=invalid-name
+        QTimer.singleShot(0, self.download_now_requested.emit)
+
+    @pyqtSlot()
+    def OpenSettings(self):
+        # pylint: disable=invalid-name
+        QTimer.singleShot(0, self.settings_requested.emit)
+
+def forward(command: str) -> bool:
+    """
+    Pass command to the running instance, None just checks that it's there
+    """
+    bus = QDBusConnection.sessionBus()
+    if not bus.isConnected():
+        return False
+    if command is None:
+        msg = QDBusMessage.createMethodCall(
+            SERVICE_NAME,
+            OBJECT_PATH,
+            "org.freedesktop.DBus.Peer",
+            "Ping"
+            )
+    else:
+        msg = QDBusMessage.createMethodCall(
+            SERVICE_NAME,
+            OBJECT_PATH,
+            INTERFACE,
+            COMMANDS[command]
+            )
+    reply = bus.call(msg)
+    return reply.type() == QDBusMessage.MessageType.ReplyMessage
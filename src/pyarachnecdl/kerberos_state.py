@@ -0,0 +1,86 @@
+import os
+import time
+
+from PyQt6.QtCore import (
+    QObject,
+    QFileSystemWatcher,
+    QTimer,
+    pyqtSignal,
+    pyqtSlot
+    )
+
+from . import kerberos_ticket
+
+POLL_INTERVAL = 30 * 1000
+
+class KerberosState(QObject):
+    """
+    Validity of the Kerberos ticket granting ticket. File based credential
+    caches are watched, other ones like KCM are polled while there's no
+    valid ticket.
+    """
+    ticket_acquired = pyqtSignal()
+
+    def __init__(self):
+        super().__init__()
+        self._has_ticket = None
+        self._valid_until = 0.0
+
+        self._poll_timer = QTimer(self)
+        self._poll_timer.setInterval(POLL_INTERVAL)
+        self._poll_timer.timeout.connect(self._check)
+
+        _, self._path = kerberos_ticket.ccache_location()
+        self._watcher = None
+        if self._path is not None:
+            self._watcher = QFileSystemWatcher(self)
+            self._watcher.fileChanged.connect(self._on_file_changed)
+            self._watcher.directoryChanged.connect(self._on_directory_changed)
+            self._watch()
+
+    def _watch(self):
+        # kinit replaces the cache file, it has to be watched again
+        parent = os.path.dirname(self._path)
+        if parent not in self._watcher.directories() and os.path.isdir(parent):
+            self._watcher.addPath(parent)
+        if self._path not in self._watcher.files() + self._watcher.directories() \
+                and os.path.exists(self._path):
+            self._watcher.addPath(self._path)
+            return True
+        return False
+
+    @pyqtSlot(str)
+    def _on_file_changed(self, _path: str):
+        self._watch()
+        self._check()
+
+    @pyqtSlot(str)
+    def _on_directory_changed(self, path: str):
+        # The parent directory may be /tmp, only react if the cache
+        # has been created
+        if path == self._path or self._watch():
+            self._check()
+
+    @pyqtSlot()
+    def _check(self):
+        had_ticket = self._has_ticket
+        self._has_ticket = None
+        if self.has_ticket and not had_ticket:
+            self.ticket_acquired.emit()
+
+    @property
+    def has_ticket(self) -> bool:
+        if self._has_ticket is None or time.monotonic() >= self._valid_until:
+            lifetime = kerberos_ticket.tgt_lifetime()
+            if lifetime is None:
+                # without gssapi there's no way to tell
+                self._has_ticket = True
+                self._valid_until = float("inf")
+            else:
+                self._has_ticket = lifetime > 0
+                self._valid_until = time.monotonic() + lifetime
+            if self._has_ticket:
+                self._poll_timer.stop()
+            elif self._watcher is None:
+                self._poll_timer.start()
+        return self._has_ticket
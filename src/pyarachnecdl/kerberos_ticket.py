@@ -0,0 +1,74 @@
+"""
+Kerberos credential cache checks, gssapi and krb5 are imported on first use
+"""
+
+import os
+from urllib.parse import urlsplit
+
+# the default credential cache can't be determined, it's polled
+UNKNOWN_CCACHE = "UNKNOWN:"
+
+def ccache_name() -> str:
+    """
+    Name of the default credential cache like FILE:/tmp/krb5cc_1000 or
+    KCM:, UNKNOWN_CCACHE without KRB5CCNAME and the krb5 package
+    """
+    name = os.environ.get("KRB5CCNAME")
+    if name:
+        return name
+    try:
+        import krb5
+    except ImportError:
+        # krb5.conf may set any type, Fedora defaults to KCM
+        return UNKNOWN_CCACHE
+    try:
+        return krb5.cc_default_name(krb5.init_context()).decode("utf-8")
+    except (krb5.Krb5Error, AttributeError, UnicodeDecodeError):
+        return UNKNOWN_CCACHE
+
+def ccache_location() -> tuple:
+    """
+    Type and path of the default credential cache, the path is None for
+    caches that don't live in the file system like KCM and KEYRING
+    """
+    cc_type, sep, residual = ccache_name().partition(":")
+    if not sep:
+        cc_type, residual = "FILE", cc_type
+    cc_type = cc_type.upper()
+    if cc_type in ("FILE", "DIR"):
+        # DIR::<path> selects a single cache in a collection
+        return cc_type, residual.lstrip(":")
+    return cc_type, None
+
+def tgt_lifetime() -> int:
+    """
+    Remaining lifetime of the default credentials in seconds, 0 without
+    valid credentials and None if gssapi is not available
+    """
+    try:
+        import gssapi
+    except ImportError:
+        return None
+    try:
+        lifetime = gssapi.Credentials(usage="initiate").lifetime
+    except gssapi.exceptions.GSSError:
+        return 0
+    # None means indefinite
+    return 365 * 24 * 60 * 60 if lifetime is None else lifetime
+
+def prefetch_service_ticket(url: str) -> bool:
+    """
+    Acquire the HTTP service ticket for url's host, so the next download
+    doesn't need a round trip to the KDC. Errors are left to the download.
+    """
+    try:
+        import gssapi
+    except ImportError:
+        return False
+    host = urlsplit(url).hostname
+    try:
+        name = gssapi.Name(f"HTTP@{host}", gssapi.NameType.hostbased_service)
+        gssapi.SecurityContext(name=name, usage="initiate").step()
+    except gssapi.exceptions.GSSError:
+        return False
+    return True
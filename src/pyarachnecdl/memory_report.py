@@ -0,0 +1,96 @@
+"""
+Report what holds memory, and give freed memory back to the OS
+"""
+
+import gc
+import sys
+import tracemalloc
+
+_enabled = False
+_libc = None
+
+def _proc_status() -> dict:
+    values = {}
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "VmHWM", "RssAnon", "RssFile"):
+                    values[key] = int(value.split()[0])
+    except (OSError, ValueError):
+        pass
+    return values
+
+def trim():
+    """
+    Collect garbage and return free heap memory to the OS. Python frees
+    objects, but glibc keeps the pages unless asked to release them.
+    """
+    global _libc
+    gc.collect()
+    if _libc is None:
+        import ctypes
+        import ctypes.util
+        name = ctypes.util.find_library("c")
+        _libc = ctypes.CDLL(name) if name else False
+    if _libc and hasattr(_libc, "malloc_trim"):
+        _libc.malloc_trim(0)
+
+def enable():
+    global _enabled
+    if not _enabled:
+        tracemalloc.start(10)
+        _enabled = True
+
+def report(label: str, top: int = 15):
+    if not _enabled:
+        return
+    out = sys.stderr
+    status = _proc_status()
+    print(f"Memory report: {label}", file=out)
+    print(
+        "  RSS: {:.1f} MiB (anon {:.1f} MiB, file {:.1f} MiB), peak {:.1f} MiB".format(
+            status.get("VmRSS", 0) / 1024,
+            status.get("RssAnon", 0) / 1024,
+            status.get("RssFile", 0) / 1024,
+            status.get("VmHWM", 0) / 1024
+            ),
+        file=out
+        )
+    current, peak = tracemalloc.get_traced_memory()
+    print(f"  Python heap: {current / 1024 / 1024:.1f} MiB, peak {peak / 1024 / 1024:.1f} MiB", file=out)
+
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ))
+    # group by package to see which library holds the memory
+    packages = {}
+    for stat in snapshot.statistics("filename"):
+        package = _package(stat.traceback[0].filename)
+        size, count = packages.get(package, (0, 0))
+        packages[package] = (size + stat.size, count + stat.count)
+    print(f"  {'Package':<40} {'KiB':>9} {'blocks':>9}", file=out)
+    for package, (size, count) in sorted(packages.items(), key=lambda p: p[1][0], reverse=True)[:top]:
+        print(f"  {package:<40} {size / 1024:9.1f} {count:9}", file=out)
+    print(f"  {'Line':<60} {'KiB':>9}", file=out)
+    for stat in snapshot.statistics("lineno")[:top]:
+        frame = stat.traceback[0]
+        print(f"  {_short(frame.filename) + ':' + str(frame.lineno):<60} {stat.size / 1024:9.1f}", file=out)
+    print(f"  {len(sys.modules)} modules loaded", file=out)
+
+def _package(filename: str) -> str:
+    for marker in ("site-packages/", "dist-packages/", "/src/"):
+        _, sep, rest = filename.rpartition(marker)
+        if sep:
+            return rest.split("/", 1)[0]
+    if "/lib/python" in filename:
+        return "stdlib"
+    return filename
+
+def _short(filename: str) -> str:
+    for marker in ("site-packages/", "dist-packages/", "/src/", "/lib/"):
+        _, sep, rest = filename.rpartition(marker)
+        if sep:
+            return rest
+    return filename
@@ -0,0 +1,203 @@
+"""
+Per phase download latencies, exported as Prometheus textfile and JSON
+"""
+
+import contextlib
+import json
+import os
+import threading
+import time
+
+from .file_store import FileStore
+
+# Phases: dns, tcp, tls, kerberos, request (up to the response headers,
+# contains the former ones), transfer, parse, write, nm_lookup, nm_update,
+# nm_add and total
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_local = threading.local()
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+class DownloadTrace:
+    """
+    Phase durations of one download
+    """
+    def __init__(self, profile: str):
+        self.profile = profile
+        self.start = time.perf_counter()
+        self.timestamp = time.time()
+        self.phases = {}
+        self.result = None
+
+    def add(self, name: str, seconds: float):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (profile, phase) -> Histogram
+        self._histograms = {}
+        # (profile, result) -> count
+        self._downloads = {}
+        # profile -> last finished trace
+        self._last = {}
+
+    def begin(self, profile: str) -> DownloadTrace:
+        trace = DownloadTrace(profile)
+        _local.trace = trace
+        return trace
+
+    def end(self, trace: DownloadTrace, result: str):
+        duration = time.perf_counter() - trace.start
+        trace.result = result
+        trace.add("total", duration)
+        if getattr(_local, "trace", None) is trace:
+            _local.trace = None
+        self.record(trace)
+
+    def record(self, trace: DownloadTrace):
+        """
+        Add a finished trace, e.g. one reported by the download helper
+        """
+        with self._lock:
+            for name, seconds in trace.phases.items():
+                key = (trace.profile, name)
+                if key not in self._histograms:
+                    self._histograms[key] = Histogram()
+                self._histograms[key].observe(seconds)
+            key = (trace.profile, trace.result)
+            self._downloads[key] = self._downloads.get(key, 0) + 1
+            self._last[trace.profile] = trace
+
+    def last(self, profile: str) -> DownloadTrace:
+        with self._lock:
+            return self._last.get(profile)
+
+    def summary(self, profile: str) -> str:
+        """
+        Short description of the last download for the tray's tooltip
+        """
+        with self._lock:
+            trace = self._last.get(profile)
+        if trace is None:
+            return ""
+        groups = (
+            ("connect", ("dns", "tcp", "tls")),
+            ("Kerberos", ("kerberos",)),
+            ("transfer", ("transfer",)),
+            ("NM", ("nm_lookup", "nm_update", "nm_add")),
+            )
+        parts = []
+        for label, names in groups:
+            seconds = sum(trace.phases.get(name, 0.0) for name in names)
+            if seconds >= 0.001:
+                parts.append(f"{label} {seconds:.2f} s")
+        details = f" ({', '.join(parts)})" if parts else ""
+        return f"Last download {trace.result} in {trace.phases['total']:.2f} s{details}"
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            profiles = {}
+            for (profile, result), count in self._downloads.items():
+                profiles.setdefault(profile, {"downloads": {}, "phases": {}})["downloads"][result] = count
+            for (profile, name), hist in self._histograms.items():
+                profiles[profile]["phases"][name] = {
+                    "count": hist.count,
+                    "sum": round(hist.sum, 6),
+                    }
+            for profile, trace in self._last.items():
+                profiles[profile]["last"] = {
+                    "timestamp": int(trace.timestamp),
+                    "result": trace.result,
+                    "phases": {name: round(seconds, 6) for name, seconds in trace.phases.items()},
+                    }
+        return {"updated": int(time.time()), "profiles": profiles}
+
+    def to_prometheus(self) -> str:
+        lines = [
+            "# HELP pyarachnecdl_downloads_total Downloads by result",
+            "# TYPE pyarachnecdl_downloads_total counter",
+            ]
+        with self._lock:
+            for (profile, result), count in sorted(self._downloads.items()):
+                lines.append(f'pyarachnecdl_downloads_total{{profile="{profile}",result="{result}"}} {count}')
+            lines += [
+                "# HELP pyarachnecdl_phase_seconds Duration of the download phases",
+                "# TYPE pyarachnecdl_phase_seconds histogram",
+                ]
+            for (profile, name), hist in sorted(self._histograms.items()):
+                labels = f'profile="{profile}",phase="{name}"'
+                for bound, count in zip(BUCKETS, hist.counts):
+                    lines.append(f'pyarachnecdl_phase_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'pyarachnecdl_phase_seconds_bucket{{{labels},le="+Inf"}} {hist.count}')
+                lines.append(f"pyarachnecdl_phase_seconds_sum{{{labels}}} {hist.sum:.6f}")
+                lines.append(f"pyarachnecdl_phase_seconds_count{{{labels}}} {hist.count}")
+            lines += [
+                "# HELP pyarachnecdl_last_download_timestamp_seconds Time of the last download",
+                "# TYPE pyarachnecdl_last_download_timestamp_seconds gauge",
+                ]
+            for profile, trace in sorted(self._last.items()):
+                lines.append(
+                    f'pyarachnecdl_last_download_timestamp_seconds{{profile="{profile}",result="{trace.result}"}} '
+                    f"{int(trace.timestamp)}"
+                    )
+        return "\n".join(lines) + "\n"
+
+    def export(self, status_file: str, prometheus_file: str):
+        """
+        Write the enabled export files, an empty file name disables an export
+        """
+        files = [
+            (fn, render)
+            for fn, render in ((status_file, lambda: json.dumps(self.to_dict(), indent=2)),
+                               (prometheus_file, self.to_prometheus))
+            if fn
+            ]
+        if not files:
+            return
+        store = FileStore()
+        try:
+            for fn, render in files:
+                fn = os.path.expanduser(fn)
+                os.makedirs(os.path.dirname(fn), exist_ok=True)
+                store.stage(fn, render())
+            store.commit()
+        except BaseException:
+            store.discard()
+            raise
+
+def add_phase(name: str, seconds: float):
+    trace = getattr(_local, "trace", None)
+    if trace is not None:
+        trace.add(name, seconds)
+
+@contextlib.contextmanager
+def phase(name: str):
+    """
+    Add the time spent in the block to the current thread's download
+    """
+    trace = getattr(_local, "trace", None)
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, time.perf_counter() - start)
+
+metrics = Metrics()
@@ -1,6 +1,24 @@
 from enum import StrEnum, auto
 
-import dbus
+NM_BUS_NAME = "org.freedesktop.NetworkManager"
+NM_SETTINGS_PATH = "/org/freedesktop/NetworkManager/Settings"
+NM_SETTINGS_IFACE = "org.freedesktop.NetworkManager.Settings"
+NM_CONNECTION_IFACE = "org.freedesktop.NetworkManager.Settings.Connection"
+
+# NMSettingsUpdate2Flags and NMSettingsAddConnection2Flags
+NM_FLAG_TO_DISK = 0x1
+NM_FLAG_IN_MEMORY = 0x2
+# NMActiveConnectionState, an activating connection has no address or
+# name servers yet
+NM_ACTIVE_CONNECTION_STATE_ACTIVATED = 2
+
+_MAX_PARALLEL_CALLS = 16
+
+_bus = None
+_objects = {}
+# uuid -> object path, only used while removals are watched
+_connection_paths = {}
+_watch_removals = False
 
 class ConnectionType(StrEnum):
     WIRED = "802-3-ethernet"
@@ -9,6 +27,8 @@ class ConnectionType(StrEnum):
     OTHER = auto()
 
 class NetworkManagerConnection:
+    __slots__ = ("con_type", "name", "uuid")
+
     def __init__(self, con_type, con_name, con_uuid):
         self.con_type = con_type
         self.name = con_name
@@ -17,47 +37,224 @@ class NetworkManagerConnection:
     def __str__(self) -> str:
         return f"type={self.con_type} name={self.name} uuid={self.uuid}"
 
-def get_all() -> list:
-    bus = dbus.SystemBus()
-    settings = bus.get_object(
-        "org.freedesktop.NetworkManager",
-        "/org/freedesktop/NetworkManager/Settings"
-        )
+def system_bus():
+    global _bus
+    if _bus is None:
+        # dbus is imported on first use to keep it out of the startup path
+        import dbus
+        _bus = dbus.SystemBus()
+    return _bus
 
-    cons = []
-    con_obj_paths = settings.ListConnections(
-        dbus_interface="org.freedesktop.NetworkManager.Settings"
-        )
-    for obj_path in con_obj_paths:
-        con = bus.get_object("org.freedesktop.NetworkManager", obj_path)
-        settings = con.GetSettings(
-            dbus_interface="org.freedesktop.NetworkManager.Settings.Connection"
+def get_object(obj_path: str):
+    """
+    Cached proxy for a NetworkManager object. Proxies are created without
+    introspection, all calls pass dbus_interface explicitly.
+    """
+    obj = _objects.get(obj_path)
+    if obj is None:
+        obj = system_bus().get_object(NM_BUS_NAME, obj_path, introspect=False)
+        _objects[obj_path] = obj
+    return obj
+
+def settings_object():
+    return get_object(NM_SETTINGS_PATH)
+
+def get_connection_by_uuid(uuid: str) -> str:
+    obj_path = _connection_paths.get(uuid) if _watch_removals else None
+    if obj_path is None:
+        obj_path = settings_object().GetConnectionByUuid(uuid, dbus_interface=NM_SETTINGS_IFACE)
+        if _watch_removals:
+            _connection_paths[uuid] = obj_path
+    return obj_path
+
+def watch_removals():
+    """
+    Cache the uuids' object paths, the caller reports removed
+    connections with forget_connection
+    """
+    global _watch_removals
+    _watch_removals = True
+
+def forget_connection(obj_path: str):
+    for uuid, path in list(_connection_paths.items()):
+        if path == obj_path:
+            _connection_paths.pop(uuid, None)
+    _objects.pop(obj_path, None)
+
+def get_connection_settings(uuid: str) -> tuple:
+    """
+    Object path and settings of the connection with uuid. A cached path
+    that has gone stale is resolved again.
+    """
+    import dbus
+    obj_path = get_connection_by_uuid(uuid)
+    try:
+        settings = get_object(obj_path).GetSettings(dbus_interface=NM_CONNECTION_IFACE)
+    except dbus.exceptions.DBusException:
+        if uuid not in _connection_paths:
+            raise
+        forget_connection(obj_path)
+        obj_path = get_connection_by_uuid(uuid)
+        settings = get_object(obj_path).GetSettings(dbus_interface=NM_CONNECTION_IFACE)
+    return obj_path, settings
+
+def _normalize(value):
+    import dbus
+    if isinstance(value, dbus.Boolean):
+        return bool(value)
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, str):
+        return str(value)
+    if isinstance(value, int):
+        return int(value)
+    if isinstance(value, float):
+        return float(value)
+    return value
+
+def _normalize_setting(section: str, key: str, value):
+    value = _normalize(value)
+    if section == "connection" and key == "permissions" and value is not None:
+        # NetworkManager returns permissions as user:<name>:
+        value = [p.rstrip(":") for p in value]
+    return value
+
+def changed_sections(current: dict, desired: dict) -> list:
+    """
+    Sections of desired with values that differ from current. Values
+    not in desired, like the ones NetworkManager fills in, are ignored.
+    """
+    changed = []
+    for section, values in desired.items():
+        cur_values = current.get(section, {})
+        for key, value in values.items():
+            if (_normalize_setting(section, key, cur_values.get(key))
+                    != _normalize_setting(section, key, value)):
+                changed.append(section)
+                break
+    return changed
+
+def merge_settings(current: dict, desired: dict, sections: list) -> dict:
+    merged = {section: dict(values) for section, values in current.items()}
+    for section in sections:
+        merged.setdefault(section, {}).update(desired[section])
+    return merged
+
+def _is_unknown_method(ex) -> bool:
+    return ex.get_dbus_name() == "org.freedesktop.DBus.Error.UnknownMethod"
+
+def update_connection(obj_path: str, settings: dict, in_memory: bool):
+    """
+    Replace the connection's settings, Update2 is available since
+    NetworkManager 1.12
+    """
+    import dbus
+    con = get_object(obj_path)
+    flags = NM_FLAG_IN_MEMORY if in_memory else NM_FLAG_TO_DISK
+    try:
+        con.Update2(settings, dbus.UInt32(flags), {}, dbus_interface=NM_CONNECTION_IFACE)
+    except dbus.exceptions.DBusException as ex:
+        if not _is_unknown_method(ex):
+            raise
+        if in_memory:
+            con.UpdateUnsaved(settings, dbus_interface=NM_CONNECTION_IFACE)
+        else:
+            con.Update(settings, dbus_interface=NM_CONNECTION_IFACE)
+
+def add_connection(settings: dict, in_memory: bool) -> str:
+    import dbus
+    nm_settings = settings_object()
+    flags = NM_FLAG_IN_MEMORY if in_memory else NM_FLAG_TO_DISK
+    try:
+        obj_path, _ = nm_settings.AddConnection2(
+            settings,
+            dbus.UInt32(flags),
+            {},
+            dbus_interface=NM_SETTINGS_IFACE
             )
+    except dbus.exceptions.DBusException as ex:
+        if not _is_unknown_method(ex):
+            raise
+        if in_memory:
+            obj_path = nm_settings.AddConnectionUnsaved(settings, dbus_interface=NM_SETTINGS_IFACE)
+        else:
+            obj_path = nm_settings.AddConnection(settings, dbus_interface=NM_SETTINGS_IFACE)
+    uuid = str(settings["connection"]["uuid"])
+    if _watch_removals:
+        _connection_paths[uuid] = obj_path
+    return obj_path
+
+def _get_connection(obj_path) -> NetworkManagerConnection:
+    settings = get_object(obj_path).GetSettings(dbus_interface=NM_CONNECTION_IFACE)
+    # only the connection section is needed
+    con = settings["connection"]
+    try:
+        con_type = ConnectionType(str(con["type"]))
+    except ValueError:
+        con_type = ConnectionType.OTHER
+    return NetworkManagerConnection(con_type, str(con["id"]), str(con["uuid"]))
+
+def get_all() -> list:
+    con_obj_paths = settings_object().ListConnections(dbus_interface=NM_SETTINGS_IFACE)
+    if len(con_obj_paths) == 0:
+        return []
+
+    # GetSettings is one blocking round trip per connection, issue them in parallel
+    from concurrent.futures import ThreadPoolExecutor
+    workers = min(len(con_obj_paths), _MAX_PARALLEL_CALLS)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_get_connection, con_obj_paths))
+
+def is_download_allowed(settings, active_connections: dict, vpn_uuids) -> bool:
+    """
+    Check the settings' allowed networks against the active connections,
+    a dict uuid -> ConnectionType
+    """
+    active_types = set(active_connections.values())
+    if settings.allow_download_from_wifi and ConnectionType.WIFI in active_types:
+        return True
+    if settings.allow_download_from_wired and ConnectionType.WIRED in active_types:
+        return True
+    if settings.allow_download_from_vpn:
+        for uuid in vpn_uuids:
+            if active_connections.get(uuid) == ConnectionType.VPN:
+                return True
+    return not settings.allowed_connections.isdisjoint(active_connections)
+
+def get_active_types() -> dict:
+    """
+    Active connections, uuid -> ConnectionType
+    """
+    active = {}
+    for con in get_all_active():
         try:
-            con_type = ConnectionType(str(settings["connection"]["type"]))
+            active[str(con.uuid)] = ConnectionType(str(con.con_type))
         except ValueError:
-            con_type = ConnectionType.OTHER
-        con_name = str(settings["connection"]["id"])
-        con_uuid = str(settings["connection"]["uuid"])
-        cons.append(NetworkManagerConnection(con_type, con_name, con_uuid))
-
-    return cons
+            active[str(con.uuid)] = ConnectionType.OTHER
+    return active
 
 def get_all_active() -> list:
-    bus = dbus.SystemBus()
-    nm = bus.get_object(
-        "org.freedesktop.NetworkManager",
-        "/org/freedesktop/NetworkManager"
-        )
-    all_con_obj_paths = nm.GetAll(
-        "org.freedesktop.NetworkManager",
+    """
+    Activated connections, not the ones still activating
+    """
+    nm = get_object("/org/freedesktop/NetworkManager")
+    all_con_obj_paths = nm.Get(
+        NM_BUS_NAME,
+        "ActiveConnections",
         dbus_interface="org.freedesktop.DBus.Properties"
-        )["ActiveConnections"]
+        )
     cons = []
     for con_obj_path in all_con_obj_paths:
-        con = bus.get_object("org.freedesktop.NetworkManager", con_obj_path)
-        iface = dbus.Interface(con, 'org.freedesktop.DBus.Properties')
-        props = iface.GetAll("org.freedesktop.NetworkManager.Connection.Active")
+        # active connection objects are short living, don't cache them
+        con = system_bus().get_object(NM_BUS_NAME, con_obj_path, introspect=False)
+        props = con.GetAll(
+            "org.freedesktop.NetworkManager.Connection.Active",
+            dbus_interface="org.freedesktop.DBus.Properties"
+            )
+        if props.get("State") != NM_ACTIVE_CONNECTION_STATE_ACTIVATED:
+            continue
         con_name = props["Id"]
         con_type = props["Type"]
         con_uuid = props["Uuid"]
@@ -0,0 +1,96 @@
+from PyQt6.QtCore import (
+    QObject,
+    pyqtSignal,
+    pyqtSlot
+    )
+from PyQt6.QtDBus import (
+    QDBusConnection,
+    QDBusMessage,
+    QDBusObjectPath
+    )
+
+from . import network_manager_connection
+from . import resolver
+from . import server_selection
+
+class NetworkManagerState(QObject):
+    """
+    Active NetworkManager connections, updated from NetworkManager's signals
+    """
+    active_connections_changed = pyqtSignal()
+
+    def __init__(self):
+        super().__init__()
+        self._active = {}
+        self._dirty = True
+
+        bus = QDBusConnection.systemBus()
+        bus.connect(
+            "org.freedesktop.NetworkManager",
+            "/org/freedesktop/NetworkManager",
+            "org.freedesktop.DBus.Properties",
+            "PropertiesChanged",
+            self._on_properties_changed
+            )
+        bus.connect(
+            "org.freedesktop.NetworkManager",
+            "/org/freedesktop/NetworkManager",
+            "org.freedesktop.NetworkManager",
+            "StateChanged",
+            self._on_state_changed
+            )
+        # a connection that becomes activated while the global state
+        # stays the same, the empty path matches all active connections
+        bus.connect(
+            "org.freedesktop.NetworkManager",
+            "",
+            "org.freedesktop.NetworkManager.Connection.Active",
+            "StateChanged",
+            self._on_active_connection_state_changed
+            )
+        if bus.connect(
+                "org.freedesktop.NetworkManager",
+                network_manager_connection.NM_SETTINGS_PATH,
+                network_manager_connection.NM_SETTINGS_IFACE,
+                "ConnectionRemoved",
+                self._on_connection_removed
+                ):
+            network_manager_connection.watch_removals()
+
+    @pyqtSlot(QDBusMessage)
+    def _on_properties_changed(self, msg: QDBusMessage):
+        args = msg.arguments()
+        if len(args) > 1 and "ActiveConnections" in args[1]:
+            self._dirty = True
+            self.active_connections_changed.emit()
+
+    @pyqtSlot(QDBusMessage)
+    def _on_state_changed(self, _msg: QDBusMessage):
+        self._dirty = True
+        # name servers and the nearest admin server may have changed
+        # with the network
+        resolver.clear()
+        server_selection.clear()
+        # an activating connection has become activated
+        self.active_connections_changed.emit()
+
+    @pyqtSlot(QDBusMessage)
+    def _on_active_connection_state_changed(self, _msg: QDBusMessage):
+        self._dirty = True
+        self.active_connections_changed.emit()
+
+    @pyqtSlot(QDBusMessage)
+    def _on_connection_removed(self, msg: QDBusMessage):
+        args = msg.arguments()
+        if args and isinstance(args[0], QDBusObjectPath):
+            network_manager_connection.forget_connection(args[0].path())
+
+    @property
+    def active_connections(self) -> dict:
+        """
+        Active connections, uuid -> ConnectionType
+        """
+        if self._dirty:
+            self._active = network_manager_connection.get_active_types()
+            self._dirty = False
+        return self._active
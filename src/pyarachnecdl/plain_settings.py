@@ -0,0 +1,288 @@
+"""
+Settings in a plain INI file, used by the headless mode without Qt
+"""
+
+import configparser
+import json
+import os
+import threading
+import time
+
+from .file_store import FileStore
+from .settings_types import (
+    DEFAULT_PROFILE,
+    DownloadType,
+    SettingsSnapshot,
+    TimeUnit,
+    default_admin_server_url,
+    parse_enum
+    )
+
+DEFAULT_CONFIG_FILE = "~/.config/pyarachnecdl/pyarachnecdl.conf"
+DEFAULT_STATE_FILE = "~/.local/state/pyarachnecdl/state.json"
+
+class _Store:
+    def __init__(self, config_file: str, state_file: str):
+        self.config = configparser.ConfigParser(interpolation=None)
+        # keep the keys' case, they are the same as in the Qt settings
+        self.config.optionxform = str
+        self.config.read(os.path.expanduser(config_file), encoding="utf-8")
+        self.state_file = os.path.expanduser(state_file)
+        # reentrant, _state() is also called with the lock held
+        self.lock = threading.RLock()
+        self.dirty = False
+        try:
+            with open(self.state_file, encoding="utf-8") as f:
+                self.state = json.load(f)
+        except (OSError, ValueError):
+            self.state = {}
+
+class PlainSettings:
+    """
+    Same interface as Settings for everything the downloader and the
+    scheduler need. The configuration file uses the keys of the Qt
+    settings: [General] holds the global values and the default profile,
+    [profile <name>] sections hold named profiles. Values written by the
+    downloader are kept in a separate JSON state file.
+    """
+    def __init__(self,
+                 config_file: str = DEFAULT_CONFIG_FILE,
+                 state_file: str = DEFAULT_STATE_FILE,
+                 profile: str = DEFAULT_PROFILE,
+                 store: _Store = None):
+        self._store = store or _Store(config_file, state_file)
+        self._profile = profile
+        self._section = f"profile {profile}" if profile else "General"
+
+    @property
+    def profile(self) -> str:
+        return self._profile
+
+    @property
+    def profile_names(self) -> list:
+        names = [
+            section[len("profile "):]
+            for section in self._store.config.sections()
+            if section.startswith("profile ")
+            ]
+        return [DEFAULT_PROFILE] + sorted(names)
+
+    def profile_settings(self, profile: str):
+        if profile == self._profile:
+            return self
+        return PlainSettings(profile=profile, store=self._store)
+
+    @property
+    def snapshot(self) -> SettingsSnapshot:
+        return SettingsSnapshot.from_settings(self)
+
+    def _global(self, key: str, default=None) -> str:
+        return self._store.config.get("General", key, fallback=default)
+
+    def _value(self, key: str, default=None) -> str:
+        return self._store.config.get(self._section, key, fallback=default)
+
+    def _global_bool(self, key: str, default: bool) -> bool:
+        return self._store.config.getboolean("General", key, fallback=default)
+
+    def _state(self) -> dict:
+        # the profiles are downloaded in parallel
+        with self._store.lock:
+            return self._store.state.setdefault(self._profile, {})
+
+    def _set_state(self, key: str, value):
+        with self._store.lock:
+            self._state()[key] = value
+            self._store.dirty = True
+
+    def sync(self):
+        with self._store.lock:
+            if not self._store.dirty:
+                return
+            content = json.dumps(self._store.state, indent=2)
+            self._store.dirty = False
+        os.makedirs(os.path.dirname(self._store.state_file), exist_ok=True)
+        store = FileStore()
+        try:
+            store.stage(self._store.state_file, content, 0o600)
+            store.commit()
+        except BaseException:
+            store.discard()
+            raise
+
+    @property
+    def admin_server_url(self) -> str:
+        return self._value("adminServerurl", default_admin_server_url())
+
+    @property
+    def admin_server_urls(self) -> list:
+        return [url.strip() for url in self._value("adminServerUrls", "").split(",") if url.strip()]
+
+    @property
+    def server_discovery(self) -> str:
+        return self._value("serverDiscovery", "")
+
+    @property
+    def auto_download(self) -> bool:
+        return self._global_bool("autoDownload", True)
+
+    @property
+    def connection_uuid(self) -> str:
+        return self._state().get("connectionUuid") or self._value("connectionUuid", "")
+
+    @connection_uuid.setter
+    def connection_uuid(self, uuid: str):
+        self._set_state("connectionUuid", uuid)
+
+    @property
+    def download_delay(self) -> int:
+        return int(self._global("downloadDelay", 5))
+
+    @property
+    def download_delay_unit(self) -> TimeUnit:
+        return parse_enum(TimeUnit, self._global("downloadDelayUnit", TimeUnit.MIN.name))
+
+    @property
+    def download_destination(self) -> str:
+        return self._value("downloadDestination", "~")
+
+    @property
+    def download_interval(self) -> int:
+        return int(self._global("downloadInterval", 60))
+
+    @property
+    def download_interval_unit(self) -> TimeUnit:
+        return parse_enum(TimeUnit, self._global("downloadIntervalUnit", TimeUnit.MIN.name))
+
+    @property
+    def download_type(self) -> DownloadType:
+        return parse_enum(DownloadType, self._value("downloadType", DownloadType.NETWORK_MANAGER.name))
+
+    @property
+    def ignore_ssl_errors(self) -> bool:
+        return self._store.config.getboolean(self._section, "ignoreSslErrors", fallback=False)
+
+    @property
+    def last_successful_download(self) -> int:
+        return int(self._state().get("lastSuccesfulDownload", -1))
+
+    @property
+    def allow_download_from_wifi(self) -> bool:
+        return self._global_bool("allowDownloadFromWifi", True)
+
+    @property
+    def allow_download_from_wired(self) -> bool:
+        return self._global_bool("allowDownloadFromWired", True)
+
+    @property
+    def allow_download_from_vpn(self) -> bool:
+        return self._global_bool("allowDownloadFromVpn", True)
+
+    @property
+    def allowed_connections(self) -> list:
+        return [uuid.strip() for uuid in self._global("allowedConnections", "").split(",") if uuid.strip()]
+
+    @property
+    def ca_cert_filename(self) -> str:
+        return self._value("caCertFilename", "")
+
+    @property
+    def user_cert_filename(self) -> str:
+        return self._value("userCertFilename", "")
+
+    @property
+    def private_key_filename(self) -> str:
+        return self._value("privateKeyFilename", "")
+
+    @property
+    def download_jitter(self) -> int:
+        return int(self._global("downloadJitter", 20))
+
+    @property
+    def max_backoff(self) -> int:
+        return int(self._global("maxBackoff", 6 * 60 * 60))
+
+    @property
+    def require_kerberos_ticket(self) -> bool:
+        return self._global_bool("requireKerberosTicket", True)
+
+    @property
+    def prefetch_service_ticket(self) -> bool:
+        return self._global_bool("prefetchServiceTicket", False)
+
+    @property
+    def low_memory(self) -> bool:
+        return self._global_bool("lowMemory", False)
+
+    @property
+    def download_in_helper(self) -> bool:
+        # the helper reads the Qt settings
+        return False
+
+    @property
+    def subscribe_to_changes(self) -> bool:
+        return self._global_bool("subscribeToChanges", False)
+
+    @property
+    def certificate_refresh(self) -> int:
+        return int(self._global("certificateRefresh", 0))
+
+    @property
+    def certificate_expiry(self) -> int:
+        return int(self._state().get("certificateExpiry", -1))
+
+    @certificate_expiry.setter
+    def certificate_expiry(self, expiry: int):
+        self._set_state("certificateExpiry", expiry)
+
+    @property
+    def cert_files(self) -> tuple:
+        return tuple(self._state().get("certFiles", ()))
+
+    @cert_files.setter
+    def cert_files(self, files: tuple):
+        self._set_state("certFiles", list(files))
+
+    @property
+    def connect_timeout(self) -> float:
+        return float(self._global("connectTimeout", 3))
+
+    @property
+    def read_timeout(self) -> float:
+        return float(self._global("readTimeout", 10))
+
+    @property
+    def total_timeout(self) -> float:
+        return float(self._global("totalTimeout", 30))
+
+    @property
+    def dns_cache_time(self) -> int:
+        return int(self._global("dnsCacheTime", 60))
+
+    @property
+    def max_download_size(self) -> int:
+        return int(self._global("maxDownloadSize", 1024 * 1024))
+
+    @property
+    def store_connection_in_memory(self) -> bool:
+        return self._global_bool("storeConnectionInMemory", False)
+
+    @property
+    def status_file(self) -> str:
+        return self._global("statusFile", "")
+
+    @property
+    def prometheus_file(self) -> str:
+        return self._global("prometheusFile", "")
+
+    def cache_validators(self, dl_type: DownloadType) -> tuple:
+        validators = self._state().get("cacheValidators", {}).get(dl_type.name, ["", "", ""])
+        return tuple(validators)
+
+    def set_cache_validators(self, dl_type: DownloadType, etag: str, last_modified: str, digest: str):
+        with self._store.lock:
+            self._state().setdefault("cacheValidators", {})[dl_type.name] = [etag, last_modified, digest]
+            self._store.dirty = True
+
+    def touch_last_successful_download(self):
+        self._set_state("lastSuccesfulDownload", int(time.time()))
@@ -0,0 +1,49 @@
+"""
+In-process cache for host name lookups
+"""
+
+import socket
+import threading
+import time
+
+DEFAULT_CACHE_TIME = 60
+# failed lookups are cached for at most this many seconds
+NEGATIVE_CACHE_TIME = 10
+
+_lock = threading.Lock()
+# (host, port) -> (expires, addrinfos or gaierror)
+_cache = {}
+
+def resolve(host: str, port: int, cache_time: float = DEFAULT_CACHE_TIME) -> list:
+    """
+    getaddrinfo for TCP connections to host:port. Results are cached for
+    cache_time seconds, failures for a shorter time. getaddrinfo doesn't
+    report the records' TTL, the system resolver may cache on its own.
+    """
+    key = (host, port)
+    now = time.monotonic()
+    with _lock:
+        entry = _cache.get(key)
+    if entry is not None and entry[0] > now:
+        result = entry[1]
+        if isinstance(result, socket.gaierror):
+            raise socket.gaierror(result.errno, result.strerror)
+        return result
+
+    try:
+        result = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+    except socket.gaierror as ex:
+        with _lock:
+            _cache[key] = (now + min(cache_time, NEGATIVE_CACHE_TIME), ex)
+        raise
+    if cache_time > 0:
+        with _lock:
+            _cache[key] = (now + cache_time, result)
+    return result
+
+def clear():
+    """
+    Forget all lookups, e.g. after the network has changed
+    """
+    with _lock:
+        _cache.clear()
@@ -0,0 +1,109 @@
+"""
+Download schedule with jitter and exponential backoff
+"""
+
+import email.utils
+import random
+import time
+
+# seconds after resume before an overdue download, the network needs a
+# moment to come up
+RESUME_DELAY = 5
+
+def parse_retry_after(value: str) -> float:
+    """
+    Seconds from a Retry-After header, either delay seconds or a HTTP date
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+class DownloadSchedule:
+    """
+    Computes the delay until the next scheduled download. Delays get
+    randomised by the settings' jitter, consecutive failures back off
+    exponentially up to max_backoff and a server's Retry-After is honoured.
+    Timers don't count the time the system sleeps, so the wall clock time
+    of the scheduled download is kept for resume.
+    """
+    def __init__(self):
+        self._failures = 0
+        self._retry_after = None
+        self.due = None
+        # an overdue download after resume hasn't succeeded yet
+        self.catching_up = False
+
+    @property
+    def failures(self) -> int:
+        return self._failures
+
+    def record_success(self):
+        self._failures = 0
+        self._retry_after = None
+        self.catching_up = False
+
+    def record_failure(self, retry_after: float = None):
+        self._failures += 1
+        if retry_after is not None:
+            self._retry_after = max(retry_after, self._retry_after or 0)
+
+    def set_due(self, delay: float, now: float = None):
+        """
+        Remember when the download scheduled in delay seconds is due
+        """
+        if delay is None:
+            self.due = None
+        else:
+            self.due = (time.time() if now is None else now) + delay
+
+    def resume_delay(self, now: float = None) -> float:
+        """
+        Delay of the scheduled download after resume, None without one.
+        An overdue download is made shortly after resume and catching_up
+        is set until a download succeeds.
+        """
+        if self.due is None:
+            return None
+        remaining = self.due - (time.time() if now is None else now)
+        if remaining > 0:
+            return remaining
+        self.catching_up = True
+        return random.uniform(RESUME_DELAY, 2 * RESUME_DELAY)
+
+    @staticmethod
+    def _jitter(delay: float, jitter: float) -> float:
+        return delay * random.uniform(1 - jitter, 1 + jitter)
+
+    def first_delay(self, settings) -> float:
+        if settings.download_delay_seconds is None:
+            return None
+        return self._jitter(settings.download_delay_seconds, settings.jitter_fraction)
+
+    def next_delay(self, settings, certificate_expiry: int = -1) -> float:
+        """
+        certificate_expiry is the earliest expiry of the downloaded
+        certificates, with certificate refresh enabled the next download
+        is at the configured fraction of their remaining lifetime but not
+        before the download interval
+        """
+        interval = settings.download_interval_seconds
+        if interval is None:
+            return None
+        if self._failures > 0:
+            max_backoff = max(settings.max_backoff, interval)
+            interval = min(interval * 2 ** (self._failures - 1), max_backoff)
+        elif settings.certificate_refresh_fraction > 0 and certificate_expiry != -1:
+            remaining = certificate_expiry - time.time()
+            interval = max(interval, remaining * settings.certificate_refresh_fraction)
+        delay = self._jitter(interval, settings.jitter_fraction)
+        if self._retry_after is not None:
+            delay = max(delay, self._retry_after)
+            self._retry_after = None
+        return delay
@@ -0,0 +1,173 @@
+"""
+Admin server candidates from DNS SRV records or the settings, ranked by
+their recent latency and errors
+"""
+
+import threading
+import time
+from urllib.parse import urlsplit
+
+from .settings_types import default_admin_server_url
+
+# SRV answers are cached for their TTL, within these bounds
+MIN_SRV_CACHE_TIME = 30
+MAX_SRV_CACHE_TIME = 60 * 60
+NEGATIVE_SRV_CACHE_TIME = 60
+SRV_TIMEOUT = 2
+# weight of the latest measurement in the moving averages
+ALPHA = 0.3
+# a server with more errors is only used if there's nothing better
+MAX_ERROR_RATE = 0.5
+# a server isn't tried again for this long after a failure
+FAILURE_COOLDOWN = 30
+
+_lock = threading.Lock()
+# SRV name -> (expires, [(priority, weight, host, port)])
+_srv_cache = {}
+# base url -> ServerStats
+_stats = {}
+
+class ServerStats:
+    def __init__(self):
+        self.latency = None
+        self.error_rate = 0.0
+        self.failed_at = None
+
+    def healthy(self, now: float) -> bool:
+        if self.failed_at is not None and now - self.failed_at < FAILURE_COOLDOWN:
+            return False
+        return self.error_rate <= MAX_ERROR_RATE
+
+def _lookup_srv(name: str) -> tuple:
+    """
+    SRV records and their TTL, needs dnspython
+    """
+    try:
+        import dns.exception
+        import dns.resolver
+    except ImportError:
+        return [], MAX_SRV_CACHE_TIME
+    try:
+        answer = dns.resolver.resolve(name, "SRV", lifetime=SRV_TIMEOUT)
+    except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
+        return [], NEGATIVE_SRV_CACHE_TIME
+    except dns.exception.DNSException:
+        # try again soon, the cached records are used meanwhile
+        return None, NEGATIVE_SRV_CACHE_TIME
+    records = [
+        (r.priority, r.weight, str(r.target).rstrip("."), r.port)
+        for r in answer
+        ]
+    # a single record with target "." means there's no such service
+    records = [r for r in records if r[2]]
+    return records, answer.rrset.ttl
+
+def srv_records(name: str) -> list:
+    """
+    (priority, weight, host, port) sorted by priority and weight
+    """
+    now = time.monotonic()
+    with _lock:
+        entry = _srv_cache.get(name)
+    if entry is not None and entry[0] > now:
+        return entry[1]
+
+    records, ttl = _lookup_srv(name)
+    if records is None:
+        records = entry[1] if entry is not None else []
+    else:
+        records = sorted(records, key=lambda r: (r[0], -r[1]))
+    ttl = min(max(ttl, MIN_SRV_CACHE_TIME), MAX_SRV_CACHE_TIME)
+    with _lock:
+        _srv_cache[name] = (now + ttl, records)
+    return records
+
+def _server_url(template: str, host: str, port: int) -> str:
+    # scheme and path are taken from the configured url
+    parts = urlsplit(template)
+    default_port = 443 if parts.scheme == "https" else 80
+    netloc = host if port == default_port else f"{host}:{port}"
+    return f"{parts.scheme}://{netloc}{parts.path.rstrip('/')}"
+
+def record_success(url: str, latency: float):
+    with _lock:
+        stats = _stats.setdefault(url, ServerStats())
+        if stats.latency is None:
+            stats.latency = latency
+        else:
+            stats.latency += ALPHA * (latency - stats.latency)
+        stats.error_rate *= 1 - ALPHA
+        stats.failed_at = None
+
+def record_failure(url: str):
+    with _lock:
+        stats = _stats.setdefault(url, ServerStats())
+        stats.error_rate += ALPHA * (1 - stats.error_rate)
+        stats.failed_at = time.monotonic()
+
+def stats(url: str) -> ServerStats:
+    with _lock:
+        return _stats.get(url)
+
+def clear():
+    """
+    Forget the SRV records and the servers' statistics
+    """
+    with _lock:
+        _srv_cache.clear()
+        _stats.clear()
+
+class ServerList:
+    """
+    Admin server base urls of a profile. Read from the settings in the
+    calling thread, candidates() may be used from any thread.
+    """
+    def __init__(self, admin_server_url: str, admin_server_urls: list, server_discovery: str,
+                 guessed: bool = False):
+        self.admin_server_url = admin_server_url
+        self.admin_server_urls = admin_server_urls
+        self.server_discovery = server_discovery
+        # admin_server_url is the default derived from the host name
+        self.guessed = guessed
+
+    @classmethod
+    def from_settings(cls, settings):
+        admin_server_url = settings.admin_server_url
+        return cls(
+            admin_server_url,
+            list(settings.admin_server_urls),
+            settings.server_discovery,
+            admin_server_url == default_admin_server_url()
+            )
+
+    def candidates(self) -> list:
+        """
+        Base urls, the ones to try first at the front. Healthy servers
+        come before failing ones, then the moving average of the latency
+        decides, SRV priority only between servers without measurements.
+        Those are tried before known ones, so each one gets measured.
+        """
+        servers = {}
+        if self.server_discovery:
+            for priority, _, host, port in srv_records(self.server_discovery):
+                servers.setdefault(_server_url(self.admin_server_url, host, port), priority)
+        # configured servers rank like the best SRV targets
+        priority = min(servers.values(), default=0)
+        configured = self.admin_server_urls
+        if not (servers and self.guessed):
+            # the guessed default may not exist, it's only used if
+            # discovery finds nothing
+            configured = [self.admin_server_url] + configured
+        for url in configured:
+            servers.setdefault(url.rstrip("/"), priority)
+        if len(servers) == 1:
+            return list(servers)
+
+        now = time.monotonic()
+        def rank(item):
+            url, priority = item
+            server_stats = stats(url)
+            if server_stats is None or server_stats.latency is None:
+                return (server_stats is not None and not server_stats.healthy(now), 0.0, priority)
+            return (not server_stats.healthy(now), server_stats.latency, priority)
+        return [url for url, _ in sorted(servers.items(), key=rank)]
@@ -1,46 +1,135 @@
-from enum import StrEnum
-import socket
+import contextlib
+import os
 import ast
 import time
 
 from PyQt6.QtCore import QSettings
 from PyQt6.QtWidgets import QApplication
 
-class DownloadType(StrEnum):
-    """
-    Downlod Type
-    """
-    NETWORK_MANAGER = "Network Manager Configuration"
-    OVPN = ".ovpn File"
-
-class TimeUnit(StrEnum):
-    """
-    Time Unit
-    """
-    SEC = "Seconds"
-    MIN = "Minutes"
-    HOUR = "Hours"
+from .settings_types import (
+    DEFAULT_PROFILE,
+    DownloadType,
+    SettingsSnapshot,
+    TimeUnit,
+    default_admin_server_url,
+    parse_enum
+    )
 
 class Settings(QSettings):
     """
     Settings Dialog
+
+    Server related values are kept per profile. The default profile uses
+    the top level keys, named profiles the keys in group profiles/<name>.
     """
-    def __init__(self):
+    def __init__(self, profile: str = DEFAULT_PROFILE):
         app = QApplication.instance()
         org_name = app.organizationName().replace(" ", "")
         app_name = app.applicationName().replace(" ", "")
         super().__init__(org_name, app_name)
+        self._profile = profile
+        self._profiles = {}
+        self._snapshot = None
+        self._snapshot_mtime = None
+        self._in_batch = False
+
+    def _profile_key(self, key: str) -> str:
+        if self._profile:
+            return f"profiles/{self._profile}/{key}"
+        return key
+
+    @property
+    def profile(self) -> str:
+        return self._profile
+
+    @property
+    def profile_names(self) -> list:
+        self.beginGroup("profiles")
+        names = self.childGroups()
+        self.endGroup()
+        return [DEFAULT_PROFILE] + sorted(names)
+
+    def profile_settings(self, profile: str):
+        """
+        Settings of another profile, sharing the non profile values
+        """
+        if profile == self._profile:
+            return self
+        if profile not in self._profiles:
+            self._profiles[profile] = Settings(profile)
+        return self._profiles[profile]
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.fileName()).st_mtime_ns
+        except OSError:
+            return None
+
+    def setValue(self, key, value):
+        # pylint: disable=invalid-name
+        super().setValue(key, value)
+        self._snapshot = None
+
+    def remove(self, key):
+        super().remove(key)
+        self._snapshot = None
+
+    def sync(self):
+        if not self._in_batch:
+            super().sync()
+        self._snapshot = None
+
+    @contextlib.contextmanager
+    def batch_update(self):
+        """
+        Group several changes, they are written with one sync at the end
+        """
+        self._in_batch = True
+        try:
+            yield self
+        finally:
+            self._in_batch = False
+            self.sync()
+
+    @property
+    def snapshot(self) -> SettingsSnapshot:
+        mtime = self._file_mtime()
+        if self._snapshot is None or mtime != self._snapshot_mtime:
+            self._snapshot = SettingsSnapshot.from_settings(self)
+            self._snapshot_mtime = mtime
+        return self._snapshot
 
     @property
     def admin_server_url(self) -> str:
-        return self.value(
-            "adminServerurl",
-            "https://arachne." + ".".join(socket.gethostname().split(".")[1:]) + "/arachne"
-            )
+        return self.value(self._profile_key("adminServerurl"), default_admin_server_url())
 
     @admin_server_url.setter
     def admin_server_url(self, url: str):
-        self.setValue("adminServerurl", url)
+        self.setValue(self._profile_key("adminServerurl"), url)
+
+    @property
+    def admin_server_urls(self) -> list:
+        """
+        More admin servers with the same configuration, the fastest
+        healthy one is used
+        """
+        return ast.literal_eval(self.value(self._profile_key("adminServerUrls"), "[]"))
+
+    @admin_server_urls.setter
+    def admin_server_urls(self, urls: list):
+        self.setValue(self._profile_key("adminServerUrls"), str(urls))
+
+    @property
+    def server_discovery(self) -> str:
+        """
+        SRV name like _arachne._tcp.example.com to look up admin servers,
+        empty to disable
+        """
+        return self.value(self._profile_key("serverDiscovery"), "")
+
+    @server_discovery.setter
+    def server_discovery(self, name: str):
+        self.setValue(self._profile_key("serverDiscovery"), name)
 
     @property
     def auto_download(self) -> bool:
@@ -52,11 +141,11 @@ class Settings(QSettings):
 
     @property
     def connection_uuid(self) -> str:
-        return self.value("connectionUuid", "")
+        return self.value(self._profile_key("connectionUuid"), "")
 
     @connection_uuid.setter
     def connection_uuid(self, uuid: str):
-        self.setValue("connectionUuid", uuid)
+        self.setValue(self._profile_key("connectionUuid"), uuid)
 
     @property
     def download_delay(self) -> int:
@@ -68,17 +157,7 @@ class Settings(QSettings):
 
     @property
     def download_delay_unit(self) -> TimeUnit:
-        v = self.value("downloadDelayUnit", TimeUnit.MIN.name)
-        try:
-            v = int(v)
-        except ValueError:
-            pass
-        if isinstance(v, str):
-            return TimeUnit[v]
-        if isinstance(v, int):
-            return list(TimeUnit)[v]
-
-        return None
+        return parse_enum(TimeUnit, self.value("downloadDelayUnit", TimeUnit.MIN.name))
 
     @download_delay_unit.setter
     def download_delay_unit(self, unit: TimeUnit):
@@ -86,11 +165,11 @@ class Settings(QSettings):
 
     @property
     def download_destination(self) -> str:
-        return self.value("downloadDestination")
+        return self.value(self._profile_key("downloadDestination"))
 
     @download_destination.setter
     def download_destination(self, destination: str):
-        self.setValue("downloadDestination", destination)
+        self.setValue(self._profile_key("downloadDestination"), destination)
 
     @property
     def download_interval(self) -> int:
@@ -102,17 +181,7 @@ class Settings(QSettings):
 
     @property
     def download_interval_unit(self) -> TimeUnit:
-        v = self.value("downloadIntervalUnit", TimeUnit.MIN.name)
-        try:
-            v = int(v)
-        except ValueError:
-            pass
-        if isinstance(v, str):
-            return TimeUnit[v]
-        if isinstance(v, int):
-            return list(TimeUnit)[v]
-
-        return None
+        return parse_enum(TimeUnit, self.value("downloadIntervalUnit", TimeUnit.MIN.name))
 
     @download_interval_unit.setter
     def download_interval_unit(self, unit: TimeUnit):
@@ -120,37 +189,27 @@ class Settings(QSettings):
 
     @property
     def download_type(self) -> DownloadType:
-        v = self.value("downloadType", DownloadType.NETWORK_MANAGER.name)
-        try:
-            v = int(v)
-        except ValueError:
-            pass
-        if isinstance(v, str):
-            return DownloadType[v]
-        if isinstance(v, int):
-            return list(DownloadType)[v]
-
-        return None
+        return parse_enum(DownloadType, self.value(self._profile_key("downloadType"), DownloadType.NETWORK_MANAGER.name))
 
     @download_type.setter
     def download_type(self, dl_type: DownloadType):
-        self.setValue("downloadType", dl_type.name)
+        self.setValue(self._profile_key("downloadType"), dl_type.name)
 
     @property
     def ignore_ssl_errors(self) -> bool:
-        return self.value("ignoreSslErrors", False, type=bool)
+        return self.value(self._profile_key("ignoreSslErrors"), False, type=bool)
 
     @ignore_ssl_errors.setter
     def ignore_ssl_errors(self, ignore: bool):
-        self.setValue("ignoreSslErrors", ignore)
+        self.setValue(self._profile_key("ignoreSslErrors"), ignore)
 
     @property
     def last_successful_download(self) -> int:
-        return int(self.value("lastSuccesfulDownload", -1))
+        return int(self.value(self._profile_key("lastSuccesfulDownload"), -1))
 
     @last_successful_download.setter
     def last_successful_download(self, last_dl: int):
-        self.setValue("lastSuccesfulDownload", last_dl)
+        self.setValue(self._profile_key("lastSuccesfulDownload"), last_dl)
 
     @property
     def allow_download_from_wifi(self) -> bool:
@@ -184,6 +243,242 @@ class Settings(QSettings):
     def allowed_connections(self, cons: list):
         self.setValue("allowedConnections", str(cons))
 
+    @property
+    def ca_cert_filename(self) -> str:
+        return self.value(self._profile_key("caCertFilename"), "")
+
+    @ca_cert_filename.setter
+    def ca_cert_filename(self, fn: str):
+        self.setValue(self._profile_key("caCertFilename"), fn)
+
+    @property
+    def user_cert_filename(self) -> str:
+        return self.value(self._profile_key("userCertFilename"), "")
+
+    @user_cert_filename.setter
+    def user_cert_filename(self, fn: str):
+        self.setValue(self._profile_key("userCertFilename"), fn)
+
+    @property
+    def private_key_filename(self) -> str:
+        return self.value(self._profile_key("privateKeyFilename"), "")
+
+    @private_key_filename.setter
+    def private_key_filename(self, fn: str):
+        self.setValue(self._profile_key("privateKeyFilename"), fn)
+
+    @property
+    def download_jitter(self) -> int:
+        """
+        Random variation of delay and interval in percent
+        """
+        return int(self.value("downloadJitter", 20))
+
+    @download_jitter.setter
+    def download_jitter(self, jitter: int):
+        self.setValue("downloadJitter", jitter)
+
+    @property
+    def max_backoff(self) -> int:
+        return int(self.value("maxBackoff", 6 * 60 * 60))
+
+    @max_backoff.setter
+    def max_backoff(self, seconds: int):
+        self.setValue("maxBackoff", seconds)
+
+    @property
+    def require_kerberos_ticket(self) -> bool:
+        """
+        Don't try to download without a valid ticket granting ticket
+        """
+        return self.value("requireKerberosTicket", True, type=bool)
+
+    @require_kerberos_ticket.setter
+    def require_kerberos_ticket(self, require: bool):
+        self.setValue("requireKerberosTicket", require)
+
+    @property
+    def prefetch_service_ticket(self) -> bool:
+        """
+        Acquire the admin server's service ticket before a scheduled download
+        """
+        return self.value("prefetchServiceTicket", False, type=bool)
+
+    @prefetch_service_ticket.setter
+    def prefetch_service_ticket(self, prefetch: bool):
+        self.setValue("prefetchServiceTicket", prefetch)
+
+    @property
+    def low_memory(self) -> bool:
+        """
+        Release the download workers and their sessions after each download
+        """
+        return self.value("lowMemory", False, type=bool)
+
+    @low_memory.setter
+    def low_memory(self, low_memory: bool):
+        self.setValue("lowMemory", low_memory)
+
+    @property
+    def download_in_helper(self) -> bool:
+        """
+        Download in a short living subprocess, so its memory is returned
+        to the OS when it exits
+        """
+        return self.value("downloadInHelper", False, type=bool)
+
+    @download_in_helper.setter
+    def download_in_helper(self, in_helper: bool):
+        self.setValue("downloadInHelper", in_helper)
+
+    @property
+    def subscribe_to_changes(self) -> bool:
+        """
+        Keep an event stream to the admin server open and download when
+        it announces a changed configuration, instead of polling
+        """
+        return self.value("subscribeToChanges", False, type=bool)
+
+    @subscribe_to_changes.setter
+    def subscribe_to_changes(self, subscribe: bool):
+        self.setValue("subscribeToChanges", subscribe)
+
+    @property
+    def certificate_refresh(self) -> int:
+        """
+        Download again after this percentage of the remaining certificate
+        lifetime instead of the download interval, 0 to disable
+        """
+        return int(self.value("certificateRefresh", 0))
+
+    @certificate_refresh.setter
+    def certificate_refresh(self, percent: int):
+        self.setValue("certificateRefresh", percent)
+
+    @property
+    def certificate_expiry(self) -> int:
+        """
+        Earliest notAfter of the downloaded certificates, -1 if unknown
+        """
+        return int(self.value(self._profile_key("certificateExpiry"), -1))
+
+    @certificate_expiry.setter
+    def certificate_expiry(self, expiry: int):
+        self.setValue(self._profile_key("certificateExpiry"), expiry)
+
+    @property
+    def cert_files(self) -> tuple:
+        """
+        CA, user certificate and private key files of the last download,
+        empty if unknown
+        """
+        return tuple(ast.literal_eval(self.value(self._profile_key("certFiles"), "()")))
+
+    @cert_files.setter
+    def cert_files(self, files: tuple):
+        self.setValue(self._profile_key("certFiles"), str(tuple(files)))
+
+    @property
+    def connect_timeout(self) -> float:
+        return float(self.value("connectTimeout", 3))
+
+    @connect_timeout.setter
+    def connect_timeout(self, seconds: float):
+        self.setValue("connectTimeout", seconds)
+
+    @property
+    def read_timeout(self) -> float:
+        return float(self.value("readTimeout", 10))
+
+    @read_timeout.setter
+    def read_timeout(self, seconds: float):
+        self.setValue("readTimeout", seconds)
+
+    @property
+    def total_timeout(self) -> float:
+        """
+        Maximum time for a download, checked while the response is read
+        """
+        return float(self.value("totalTimeout", 30))
+
+    @total_timeout.setter
+    def total_timeout(self, seconds: float):
+        self.setValue("totalTimeout", seconds)
+
+    @property
+    def dns_cache_time(self) -> int:
+        return int(self.value("dnsCacheTime", 60))
+
+    @dns_cache_time.setter
+    def dns_cache_time(self, seconds: int):
+        self.setValue("dnsCacheTime", seconds)
+
+    @property
+    def max_download_size(self) -> int:
+        return int(self.value("maxDownloadSize", 1024 * 1024))
+
+    @max_download_size.setter
+    def max_download_size(self, size: int):
+        self.setValue("maxDownloadSize", size)
+
+    @property
+    def store_connection_in_memory(self) -> bool:
+        """
+        Keep the NetworkManager connection in memory only, it's added
+        again after NetworkManager has been restarted
+        """
+        return self.value("storeConnectionInMemory", False, type=bool)
+
+    @store_connection_in_memory.setter
+    def store_connection_in_memory(self, in_memory: bool):
+        self.setValue("storeConnectionInMemory", in_memory)
+
+    @property
+    def status_file(self) -> str:
+        """
+        JSON file with download metrics like
+        ~/.local/state/pyarachnecdl/status.json, empty to disable. It's
+        written after each download.
+        """
+        return self.value("statusFile", "")
+
+    @status_file.setter
+    def status_file(self, fn: str):
+        self.setValue("statusFile", fn)
+
+    @property
+    def prometheus_file(self) -> str:
+        """
+        Prometheus textfile collector file, empty to disable
+        """
+        return self.value("prometheusFile", "")
+
+    @prometheus_file.setter
+    def prometheus_file(self, fn: str):
+        self.setValue("prometheusFile", fn)
+
+    def cache_validators(self, dl_type: DownloadType) -> tuple:
+        self.beginGroup(self._profile_key(f"cacheValidators/{dl_type.name}"))
+        validators = (
+            self.value("etag", ""),
+            self.value("lastModified", ""),
+            self.value("digest", "")
+            )
+        self.endGroup()
+        return validators
+
+    def set_cache_validators(self, dl_type: DownloadType, etag: str, last_modified: str, digest: str):
+        self.beginGroup(self._profile_key(f"cacheValidators/{dl_type.name}"))
+        self.setValue("etag", etag)
+        self.setValue("lastModified", last_modified)
+        self.setValue("digest", digest)
+        self.endGroup()
+
+    def clear_cache_validators(self):
+        self.remove("cacheValidators")
+        for profile in self.profile_names[1:]:
+            self.remove(f"profiles/{profile}/cacheValidators")
+
     def touch_last_successful_download(self):
         now = int(time.time())
         self.last_successful_download = now
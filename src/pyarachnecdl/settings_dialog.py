@@ -187,6 +187,14 @@ class SettingsDialog(QDialog):
         grid.addLayout(hbox, cur_line, 1)
         cur_line += 1
 
+        grid.addWidget(QLabel("Random Jitter:"), cur_line, 0)
+        self.download_jitter = QSpinBox()
+        self.download_jitter.setRange(0, 50)
+        self.download_jitter.setSuffix(" %")
+        self.download_jitter.setEnabled(False)
+        grid.addWidget(self.download_jitter, cur_line, 1)
+        cur_line += 1
+
         grid.addWidget(QLabel("Download Type:"))
         self.download_type = QComboBox()
         for dt in DownloadType:
@@ -215,11 +223,13 @@ class SettingsDialog(QDialog):
             self.download_delay_unit.setEnabled(True)
             self.download_interval.setEnabled(True)
             self.download_interval_unit.setEnabled(True)
+            self.download_jitter.setEnabled(True)
         elif state == Qt.CheckState.Unchecked:
             self.download_delay.setEnabled(False)
             self.download_delay_unit.setEnabled(False)
             self.download_interval.setEnabled(False)
             self.download_interval_unit.setEnabled(False)
+            self.download_jitter.setEnabled(False)
 
     def _on_change_download_type(self, index: int):
         self.download_destination.setEnabled(list(DownloadType)[index] == DownloadType.OVPN)
@@ -236,6 +246,7 @@ class SettingsDialog(QDialog):
         self.download_delay_unit.setCurrentIndex(
             self.download_delay_unit.findData(settings.download_delay_unit)
             )
+        self.download_jitter.setValue(settings.download_jitter)
         self.download_type.setCurrentIndex(
             self.download_type.findData(settings.download_type)
             )
@@ -263,12 +274,13 @@ class SettingsDialog(QDialog):
 
     def save_settings(self, settings: Settings):
         settings.admin_server_url = self.admin_server_url.text()
-        settings.ignore_ssl_error = self.ignore_ssl_error.isChecked()
+        settings.ignore_ssl_errors = self.ignore_ssl_error.isChecked()
         settings.auto_download = self.download_periodically.isChecked()
         settings.download_interval = self.download_interval.value()
         settings.download_interval_unit = self.download_interval_unit.currentData()
         settings.download_delay = self.download_delay.value()
         settings.download_delay_unit = self.download_delay_unit.currentData()
+        settings.download_jitter = self.download_jitter.value()
         settings.download_type = self.download_type.currentData()
         settings.download_destination = self.download_destination.text()
 
@@ -0,0 +1,123 @@
+"""
+Settings values and types that don't depend on Qt
+"""
+
+from enum import StrEnum
+from dataclasses import dataclass
+import functools
+import socket
+
+DEFAULT_PROFILE = ""
+MAX_DOWNLOAD_WORKERS = 4
+
+class DownloadType(StrEnum):
+    """
+    Downlod Type
+    """
+    NETWORK_MANAGER = "Network Manager Configuration"
+    OVPN = ".ovpn File"
+
+class TimeUnit(StrEnum):
+    """
+    Time Unit
+    """
+    SEC = "Seconds"
+    MIN = "Minutes"
+    HOUR = "Hours"
+
+_TIME_UNIT_SECONDS = {
+    TimeUnit.SEC: 1,
+    TimeUnit.MIN: 60,
+    TimeUnit.HOUR: 60 * 60,
+    }
+
+def parse_enum(enum_type, v):
+    """
+    Enum from its name or from its index as written by older versions
+    """
+    try:
+        v = int(v)
+    except (TypeError, ValueError):
+        pass
+    if isinstance(v, str):
+        return enum_type[v]
+    if isinstance(v, int):
+        return list(enum_type)[v]
+
+    return None
+
+def to_seconds(value: int, unit: TimeUnit) -> int:
+    if unit not in _TIME_UNIT_SECONDS:
+        return None
+    return value * _TIME_UNIT_SECONDS[unit]
+
+@functools.cache
+def default_admin_server_url() -> str:
+    return "https://arachne." + ".".join(socket.gethostname().split(".")[1:]) + "/arachne"
+
+@dataclass(frozen=True, slots=True)
+class SettingsSnapshot:
+    """
+    Parsed settings, read once from the settings
+    """
+    admin_server_url: str
+    auto_download: bool
+    connection_uuid: str
+    download_delay: int
+    download_delay_unit: TimeUnit
+    download_destination: str
+    download_interval: int
+    download_interval_unit: TimeUnit
+    download_type: DownloadType
+    ignore_ssl_errors: bool
+    last_successful_download: int
+    allow_download_from_wifi: bool
+    allow_download_from_wired: bool
+    allow_download_from_vpn: bool
+    allowed_connections: frozenset
+    max_download_size: int
+    jitter_fraction: float
+    max_backoff: int
+    certificate_refresh_fraction: float
+    require_kerberos_ticket: bool
+    prefetch_service_ticket: bool
+    low_memory: bool
+    download_in_helper: bool
+    subscribe_to_changes: bool
+    download_delay_seconds: int
+    download_interval_seconds: int
+
+    @classmethod
+    def from_settings(cls, settings):
+        delay = settings.download_delay
+        delay_unit = settings.download_delay_unit
+        interval = settings.download_interval
+        interval_unit = settings.download_interval_unit
+        return cls(
+            admin_server_url=settings.admin_server_url,
+            auto_download=settings.auto_download,
+            connection_uuid=settings.connection_uuid,
+            download_delay=delay,
+            download_delay_unit=delay_unit,
+            download_destination=settings.download_destination,
+            download_interval=interval,
+            download_interval_unit=interval_unit,
+            download_type=settings.download_type,
+            ignore_ssl_errors=settings.ignore_ssl_errors,
+            last_successful_download=settings.last_successful_download,
+            allow_download_from_wifi=settings.allow_download_from_wifi,
+            allow_download_from_wired=settings.allow_download_from_wired,
+            allow_download_from_vpn=settings.allow_download_from_vpn,
+            allowed_connections=frozenset(settings.allowed_connections),
+            max_download_size=settings.max_download_size,
+            jitter_fraction=settings.download_jitter / 100,
+            max_backoff=settings.max_backoff,
+            certificate_refresh_fraction=settings.certificate_refresh / 100,
+            require_kerberos_ticket=settings.require_kerberos_ticket,
+            prefetch_service_ticket=settings.prefetch_service_ticket,
+            low_memory=settings.low_memory,
+            download_in_helper=settings.download_in_helper,
+            subscribe_to_changes=settings.subscribe_to_changes,
+            download_delay_seconds=to_seconds(delay, delay_unit),
+            download_interval_seconds=to_seconds(interval, interval_unit)
+            )
@@ -0,0 +1,46 @@
+"""
+Lock that allows only one instance per user and machine to download
+"""
+
+import fcntl
+import os
+import tempfile
+
+LOCK_NAME = "pyarachnecdl.lock"
+# exit status when another instance holds the lock, the systemd unit
+# doesn't restart on it
+EXIT_ALREADY_RUNNING = 3
+
+def lock_file() -> str:
+    # not in the home directory, it may be shared with other machines
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir and os.path.isdir(runtime_dir):
+        return os.path.join(runtime_dir, LOCK_NAME)
+    return os.path.join(tempfile.gettempdir(), f"pyarachnecdl-{os.getuid()}.lock")
+
+def acquire(path: str = None):
+    """
+    Lock file object, keep it open as long as the instance runs. None if
+    another instance holds the lock.
+    """
+    path = path or lock_file()
+    f = open(path, "a+", encoding="ascii")
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        f.close()
+        return None
+    f.truncate(0)
+    f.write(f"{os.getpid()}\n")
+    f.flush()
+    return f
+
+def owner(path: str = None) -> int:
+    """
+    pid of the instance holding the lock, -1 if unknown
+    """
+    try:
+        with open(path or lock_file(), encoding="ascii") as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return -1
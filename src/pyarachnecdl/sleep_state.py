@@ -0,0 +1,74 @@
+from PyQt6.QtCore import (
+    QObject,
+    pyqtSignal,
+    pyqtSlot
+    )
+from PyQt6.QtDBus import (
+    QDBusConnection,
+    QDBusMessage
+    )
+
+LOGIN1_SERVICE = "org.freedesktop.login1"
+LOGIN1_PATH = "/org/freedesktop/login1"
+LOGIN1_MANAGER_IFACE = "org.freedesktop.login1.Manager"
+
+class SleepState(QObject):
+    """
+    Suspend and resume, from logind's PrepareForSleep signal. A delay
+    inhibitor lock gives running downloads time to finish before the
+    system sleeps, logind waits at most InhibitDelayMaxSec for it.
+    """
+    suspending = pyqtSignal()
+    resumed = pyqtSignal()
+
+    def __init__(self):
+        super().__init__()
+        self._inhibitor = None
+        self.sleeping = False
+        if QDBusConnection.systemBus().connect(
+                LOGIN1_SERVICE,
+                LOGIN1_PATH,
+                LOGIN1_MANAGER_IFACE,
+                "PrepareForSleep",
+                self._on_prepare_for_sleep
+                ):
+            self._inhibit()
+
+    def _inhibit(self):
+        if self._inhibitor is not None:
+            return
+        msg = QDBusMessage.createMethodCall(
+            LOGIN1_SERVICE,
+            LOGIN1_PATH,
+            LOGIN1_MANAGER_IFACE,
+            "Inhibit"
+            )
+        msg.setArguments([
+            "sleep",
+            "Arachne Config Downloader",
+            "Finish running configuration downloads",
+            "delay"
+            ])
+        reply = QDBusConnection.systemBus().call(msg)
+        if reply.type() == QDBusMessage.MessageType.ReplyMessage and reply.arguments():
+            # the lock is held while the file descriptor is open
+            self._inhibitor = reply.arguments()[0]
+
+    def release(self):
+        """
+        Let the system sleep, the lock is taken again after resume
+        """
+        self._inhibitor = None
+
+    @pyqtSlot(QDBusMessage)
+    def _on_prepare_for_sleep(self, msg: QDBusMessage):
+        args = msg.arguments()
+        if not args:
+            return
+        if args[0]:
+            self.sleeping = True
+            self.suspending.emit()
+        else:
+            self.sleeping = False
+            self._inhibit()
+            self.resumed.emit()
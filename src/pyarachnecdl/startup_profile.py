@@ -0,0 +1,103 @@
+"""
+Measure import and initialisation time on startup
+"""
+
+import builtins
+import importlib.machinery
+import importlib.util
+import resource
+import sys
+import time
+
+_profile = None
+
+class StartupProfile:
+    def __init__(self):
+        self._start = time.perf_counter()
+        self._last_mark = self._start
+        self._phases = []
+        # module name -> [cumulative seconds, self seconds]
+        self._imports = {}
+        self._stack = []
+        self._orig_import = builtins.__import__
+        builtins.__import__ = self._import
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        # pylint: disable=redefined-builtin
+        if level > 0 and globals is not None:
+            try:
+                abs_name = importlib.util.resolve_name("." * level + name, globals.get("__package__"))
+            except (ImportError, ValueError):
+                abs_name = name
+        else:
+            abs_name = name
+        if abs_name and abs_name not in sys.modules:
+            self._timed(abs_name, lambda: self._orig_import(name, globals, locals, (), level))
+        if abs_name and fromlist:
+            # "from package import module" imports the submodules without
+            # calling __import__, time them here
+            for item in fromlist:
+                submodule = f"{abs_name}.{item}"
+                if item != "*" and submodule not in sys.modules and self._is_submodule(submodule):
+                    self._timed(submodule, lambda m=submodule: self._orig_import(m))
+        return self._orig_import(name, globals, locals, fromlist, level)
+
+    @staticmethod
+    def _is_submodule(name: str) -> bool:
+        parent_name, _, item = name.rpartition(".")
+        parent = sys.modules.get(parent_name)
+        if item.startswith("__") or not hasattr(parent, "__path__"):
+            return False
+        try:
+            return importlib.machinery.PathFinder.find_spec(name, parent.__path__) is not None
+        except (ImportError, ValueError):
+            return False
+
+    def _timed(self, name: str, do_import):
+        start = time.perf_counter()
+        self._stack.append(0.0)
+        try:
+            return do_import()
+        finally:
+            cumulative = time.perf_counter() - start
+            children = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += cumulative
+            self._imports[name] = [cumulative, cumulative - children]
+
+    def mark(self, phase: str):
+        now = time.perf_counter()
+        self._phases.append((phase, now - self._last_mark))
+        self._last_mark = now
+
+    def report(self, top: int = 20):
+        builtins.__import__ = self._orig_import
+        total = time.perf_counter() - self._start
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        out = sys.stderr
+        print("Startup profile", file=out)
+        print(f"  {'Module':<40} {'self ms':>9} {'cum ms':>9}", file=out)
+        imports = sorted(self._imports.items(), key=lambda i: i[1][1], reverse=True)
+        for name, (cumulative, own) in imports[:top]:
+            print(f"  {name:<40} {own * 1000:9.1f} {cumulative * 1000:9.1f}", file=out)
+        print(f"  {len(self._imports)} modules imported", file=out)
+        print(f"  {'Phase':<40} {'ms':>9}", file=out)
+        for phase, duration in self._phases:
+            print(f"  {phase:<40} {duration * 1000:9.1f}", file=out)
+        print(f"  Total: {total * 1000:.1f} ms, max RSS: {max_rss / 1024:.1f} MiB", file=out)
+
+def enable():
+    global _profile
+    if _profile is None:
+        _profile = StartupProfile()
+
+def mark(phase: str):
+    if _profile is not None:
+        _profile.mark(phase)
+
+def report():
+    global _profile
+    if _profile is not None:
+        _profile.report()
+        _profile = None
@@ -0,0 +1,156 @@
+"""
+Change notifications from the admin server via server-sent events
+"""
+
+import random
+import socket
+import threading
+
+import requests
+from urllib3.exceptions import HTTPError
+
+from .downloader import USER_CONFIG_API_PATH
+from .event_stream import EventStreamParser
+from .transport import new_session
+from .server_selection import ServerList
+
+USER_CONFIG_EVENTS_API_PATH = USER_CONFIG_API_PATH + "/events"
+# the server is expected to send a comment as heartbeat more often
+READ_TIMEOUT = 90
+MIN_RECONNECT_DELAY = 1
+MAX_RECONNECT_DELAY = 5 * 60
+# event types that announce a new configuration
+CHANGE_EVENTS = ("changed", "message")
+READ_SIZE = 4096
+
+class ConfigSubscription:
+    """
+    Holds an event stream connection to the admin server in a daemon
+    thread. on_change(profile) is called from that thread for each change
+    event and after each reconnect, so changes missed while disconnected
+    are fetched. It's started after a download, so the first connect
+    doesn't notify. If the server doesn't have the endpoint the
+    subscription ends and the profile has to be polled.
+    """
+    def __init__(self, settings, on_change):
+        # read here, the settings must not be used from the thread
+        self._profile = settings.profile
+        self._servers = ServerList.from_settings(settings)
+        self._connect_timeout = settings.connect_timeout
+        self._dns_cache_time = settings.dns_cache_time
+        self._verify = not settings.ignore_ssl_errors
+        self._on_change = on_change
+        self._has_connected = False
+        self._stop = threading.Event()
+        self._thread = None
+        self._session = None
+        self._response = None
+        self._last_event_id = None
+        self._reconnect_delay = MIN_RECONNECT_DELAY
+        self.connected = False
+        self.available = True
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"ConfigSubscription-{self._profile}",
+            daemon=True
+            )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        # closing the socket doesn't wake up a blocked read, shutting it
+        # down does
+        response = self._response
+        connection = getattr(response.raw, "connection", None) if response is not None else None
+        sock = getattr(connection, "sock", None)
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _chunks(r: requests.Response):
+        # iter_content() and read(n) wait for n bytes, or for the end of
+        # a stream without length. read1() returns what has arrived.
+        read1 = getattr(r.raw, "read1", None)
+        while True:
+            if read1 is not None:
+                chunk = read1(READ_SIZE, decode_content=True)
+            else:
+                chunk = r.raw.read(1, decode_content=True)
+            if not chunk:
+                return
+            yield chunk
+
+    def _events(self, r: requests.Response):
+        parser = EventStreamParser()
+        for chunk in self._chunks(r):
+            if self._stop.is_set():
+                return
+            events = parser.feed(chunk)
+            self._last_event_id = parser.last_event_id or self._last_event_id
+            if parser.retry is not None:
+                self._reconnect_delay = max(MIN_RECONNECT_DELAY, parser.retry / 1000)
+            yield from events
+
+    def _listen(self) -> bool:
+        """
+        Returns False if the server has no event stream
+        """
+        headers = {"Accept": "text/event-stream"}
+        if self._last_event_id:
+            headers["Last-Event-ID"] = self._last_event_id
+        # the fastest healthy server, the downloads fail over
+        url = self._servers.candidates()[0] + USER_CONFIG_EVENTS_API_PATH
+        with self._session.get(
+                url,
+                headers=headers,
+                timeout=(self._connect_timeout, READ_TIMEOUT),
+                verify=self._verify,
+                stream=True
+                ) as r:
+            self._response = r
+            if self._stop.is_set():
+                return True
+            if r.status_code in (
+                    requests.codes.not_found,
+                    requests.codes.method_not_allowed,
+                    requests.codes.not_implemented
+                    ):
+                return False
+            r.raise_for_status()
+            if not r.headers.get("Content-Type", "").startswith("text/event-stream"):
+                return False
+            self.connected = True
+            self._reconnect_delay = MIN_RECONNECT_DELAY
+            if self._has_connected:
+                self._on_change(self._profile)
+            self._has_connected = True
+            for event_type in self._events(r):
+                if event_type in CHANGE_EVENTS:
+                    self._on_change(self._profile)
+        return True
+
+    def _run(self):
+        self._session = new_session(self._dns_cache_time)
+        try:
+            while not self._stop.is_set():
+                try:
+                    if not self._listen():
+                        self.available = False
+                        break
+                except (requests.exceptions.RequestException, HTTPError, OSError, ValueError):
+                    pass
+                finally:
+                    self._response = None
+                self.connected = False
+                # reconnect with exponential backoff and full jitter
+                delay = random.uniform(MIN_RECONNECT_DELAY, self._reconnect_delay)
+                self._reconnect_delay = min(self._reconnect_delay * 2, MAX_RECONNECT_DELAY)
+                self._stop.wait(delay)
+        finally:
+            self.connected = False
+            self._session.close()
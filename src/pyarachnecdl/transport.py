@@ -0,0 +1,188 @@
+"""
+HTTP adapter and Kerberos auth reporting their phases to metrics. New
+connections use the resolver's cache and happy eyeballs.
+"""
+
+import errno
+import os
+import selectors
+import socket
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests_kerberos import HTTPKerberosAuth, OPTIONAL
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+from .metrics import add_phase, phase
+from . import resolver
+
+# delay between connection attempts to the next address, RFC 8305
+CONNECTION_ATTEMPT_DELAY = 0.25
+
+def _interleave_families(addrinfos: list) -> list:
+    families = {}
+    for info in addrinfos:
+        families.setdefault(info[0], []).append(info)
+    ordered = []
+    queues = list(families.values())
+    while queues:
+        for queue in queues:
+            ordered.append(queue.pop(0))
+        queues = [queue for queue in queues if queue]
+    return ordered
+
+def happy_eyeballs_connect(addrinfos: list, timeout: float, source_address=None, socket_options=None):
+    """
+    Connect to the first address that answers. Address families are
+    interleaved and a new attempt is started every CONNECTION_ATTEMPT_DELAY
+    seconds or as soon as an attempt fails.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    pending = _interleave_families(addrinfos)
+    attempts = {}
+    last_error = None
+    next_attempt = 0.0
+    sel = selectors.DefaultSelector()
+    try:
+        while pending or attempts:
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                raise TimeoutError("timed out")
+            if pending and now >= next_attempt:
+                family, sock_type, proto, _, sockaddr = pending.pop(0)
+                sock = socket.socket(family, sock_type, proto)
+                try:
+                    for option in socket_options or ():
+                        sock.setsockopt(*option)
+                    if source_address:
+                        sock.bind(source_address)
+                    sock.setblocking(False)
+                    err = sock.connect_ex(sockaddr)
+                    if err not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+                        raise OSError(err, os.strerror(err))
+                except OSError as ex:
+                    sock.close()
+                    last_error = ex
+                    continue
+                sel.register(sock, selectors.EVENT_WRITE)
+                attempts[sock] = sockaddr
+                next_attempt = now + CONNECTION_ATTEMPT_DELAY
+
+            wait = [t - now for t in (deadline, next_attempt if pending else None) if t is not None]
+            for key, _ in sel.select(max(0.0, min(wait)) if wait else None):
+                sock = key.fileobj
+                sel.unregister(sock)
+                del attempts[sock]
+                err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if err == 0:
+                    sock.settimeout(timeout)
+                    return sock
+                sock.close()
+                last_error = OSError(err, os.strerror(err))
+                next_attempt = 0.0
+        raise last_error or OSError("No address to connect to")
+    finally:
+        for sock in attempts:
+            sock.close()
+        sel.close()
+
+class _TimedConnectionMixin:
+    def __init__(self, *args, dns_cache_time: float = resolver.DEFAULT_CACHE_TIME, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._dns_cache_time = dns_cache_time
+
+    def _new_conn(self):
+        start = time.perf_counter()
+        timeout = self.timeout if isinstance(self.timeout, (int, float)) else socket.getdefaulttimeout()
+        try:
+            with phase("dns"):
+                addrinfos = resolver.resolve(self._dns_host, self.port, self._dns_cache_time)
+            with phase("tcp"):
+                return happy_eyeballs_connect(
+                    addrinfos,
+                    timeout,
+                    self.source_address,
+                    self.socket_options
+                    )
+        except socket.gaierror as ex:
+            raise NewConnectionError(self, f"Failed to resolve '{self._dns_host}' ({ex})") from ex
+        except TimeoutError as ex:
+            raise ConnectTimeoutError(
+                self,
+                f"Connection to {self.host} timed out. (connect timeout={timeout})"
+                ) from ex
+        except OSError as ex:
+            raise NewConnectionError(self, f"Failed to establish a new connection: {ex}") from ex
+        finally:
+            self._new_conn_seconds = time.perf_counter() - start
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    def connect(self):
+        self._new_conn_seconds = 0.0
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            add_phase("tls", time.perf_counter() - start - self._new_conn_seconds)
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+class TimedHTTPAdapter(HTTPAdapter):
+    def __init__(self, *args, dns_cache_time: float = resolver.DEFAULT_CACHE_TIME, **kwargs):
+        self._dns_cache_time = dns_cache_time
+        super().__init__(*args, **kwargs)
+
+    @property
+    def dns_cache_time(self) -> float:
+        return self._dns_cache_time
+
+    @dns_cache_time.setter
+    def dns_cache_time(self, seconds: float):
+        if seconds != self._dns_cache_time:
+            self._dns_cache_time = seconds
+            # the pools pass it to their new connections
+            self.poolmanager.clear()
+
+    def _pool_factory(self, pool_cls):
+        def new_pool(host, port, **kwargs):
+            return pool_cls(host, port, dns_cache_time=self._dns_cache_time, **kwargs)
+        return new_pool
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": self._pool_factory(_TimedHTTPConnectionPool),
+            "https": self._pool_factory(_TimedHTTPSConnectionPool),
+            }
+
+class TimedKerberosAuth(HTTPKerberosAuth):
+    def generate_request_header(self, *args, **kwargs):
+        # acquiring the service ticket may need a round trip to the KDC
+        with phase("kerberos"):
+            return super().generate_request_header(*args, **kwargs)
+
+def set_dns_cache_time(session: requests.Session, seconds: float):
+    for adapter in session.adapters.values():
+        if isinstance(adapter, TimedHTTPAdapter):
+            adapter.dns_cache_time = seconds
+
+def new_session(dns_cache_time: float = resolver.DEFAULT_CACHE_TIME) -> requests.Session:
+    """
+    Session with a single keep-alive connection and Kerberos auth
+    """
+    adapter = TimedHTTPAdapter(pool_connections=1, pool_maxsize=1, dns_cache_time=dns_cache_time)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.auth = TimedKerberosAuth(mutual_authentication=OPTIONAL)
+    return session
@@ -0,0 +1,110 @@
+import base64
+import calendar
+
+import pytest
+
+from pyarachnecdl.certificates import der_validity, files_expiry, pem_validities
+
+def tlv(tag: int, content: bytes) -> bytes:
+    length = len(content)
+    if length < 0x80:
+        return bytes([tag, length]) + content
+    encoded = length.to_bytes((length.bit_length() + 7) // 8, "big")
+    return bytes([tag, 0x80 | len(encoded)]) + encoded + content
+
+def utc_time(text: str) -> bytes:
+    return tlv(0x17, text.encode("ascii"))
+
+def generalized_time(text: str) -> bytes:
+    return tlv(0x18, text.encode("ascii"))
+
+def certificate(not_before: bytes, not_after: bytes, version: bool = True, issuer_size: int = 10) -> bytes:
+    tbs = b"".join([
+        tlv(0xA0, tlv(0x02, b"\x02")) if version else b"",
+        tlv(0x02, b"\x01\x23"),
+        tlv(0x30, tlv(0x06, b"\x2a\x86\x48\x86\xf7\x0d\x01\x01\x0b")),
+        tlv(0x30, b"\x00" * issuer_size),
+        tlv(0x30, not_before + not_after),
+        tlv(0x30, b""),
+        ])
+    return tlv(0x30, tlv(0x30, tbs) + tlv(0x30, b"") + tlv(0x03, b"\x00"))
+
+def pem(der: bytes) -> str:
+    return "-----BEGIN CERTIFICATE-----\n" + base64.encodebytes(der).decode("ascii") + "-----END CERTIFICATE-----\n"
+
+def timestamp(*fields) -> int:
+    return calendar.timegm(fields + (0, 0, 0))
+
+def test_utc_time():
+    der = certificate(utc_time("240101000000Z"), utc_time("991231235959Z"))
+    assert der_validity(der) == (timestamp(2024, 1, 1, 0, 0, 0), timestamp(1999, 12, 31, 23, 59, 59))
+
+def test_utc_time_century():
+    der = certificate(utc_time("491231000000Z"), utc_time("500101000000Z"))
+    not_before, not_after = der_validity(der)
+    assert not_before == timestamp(2049, 12, 31, 0, 0, 0)
+    assert not_after == timestamp(1950, 1, 1, 0, 0, 0)
+
+def test_generalized_time():
+    der = certificate(utc_time("240101000000Z"), generalized_time("20510630120000Z"))
+    assert der_validity(der)[1] == timestamp(2051, 6, 30, 12, 0, 0)
+
+def test_long_form_lengths():
+    der = certificate(utc_time("240101000000Z"), utc_time("340101000000Z"), issuer_size=300)
+    assert der[1] == 0x82
+    assert der_validity(der)[1] == timestamp(2034, 1, 1, 0, 0, 0)
+
+def test_missing_version():
+    der = certificate(utc_time("240101000000Z"), utc_time("340101000000Z"), version=False)
+    assert der_validity(der)[1] == timestamp(2034, 1, 1, 0, 0, 0)
+
+@pytest.mark.parametrize("der", [
+    b"",
+    b"\x30",
+    b"\x04\x00",
+    b"\x30\x05\x30\x03",
+    b"\x30\x80",
+    b"\x30\x84\xff\xff",
+    certificate(utc_time("240101000000Z"), utc_time("340101000000Z"))[:-20],
+    certificate(utc_time("24010100"), utc_time("340101000000Z")),
+    certificate(tlv(0x04, b"240101000000Z"), utc_time("340101000000Z")),
+    ])
+def test_malformed(der):
+    with pytest.raises(ValueError):
+        der_validity(der)
+
+def test_pem_skips_invalid_certificates():
+    valid = certificate(utc_time("240101000000Z"), utc_time("340101000000Z"))
+    text = pem(b"\x30\x03\x01") + pem(valid) + "-----BEGIN CERTIFICATE-----\n!!!\n-----END CERTIFICATE-----\n"
+    assert pem_validities(text) == [(timestamp(2024, 1, 1, 0, 0, 0), timestamp(2034, 1, 1, 0, 0, 0))]
+
+def test_files_expiry(tmp_path):
+    first = tmp_path / "first.crt"
+    first.write_text(pem(certificate(utc_time("240101000000Z"), utc_time("340101000000Z"))))
+    second = tmp_path / "second.crt"
+    second.write_text(pem(certificate(utc_time("240101000000Z"), utc_time("300101000000Z"))))
+    assert files_expiry([first, second, tmp_path / "missing.crt"]) == timestamp(2030, 1, 1, 0, 0, 0)
+    assert files_expiry([tmp_path / "missing.crt"]) == -1
+
+def test_openssl_certificate():
+    x509 = pytest.importorskip("cryptography.x509")
+    import datetime
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import ec
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(x509.NameOID.COMMON_NAME, "arachne")])
+    not_before = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    not_after = datetime.datetime(2060, 1, 1, tzinfo=datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(1)
+        .not_valid_before(not_before)
+        .not_valid_after(not_after)
+        .sign(key, hashes.SHA256())
+        )
+    from cryptography.hazmat.primitives.serialization import Encoding
+    text = cert.public_bytes(Encoding.PEM).decode("ascii")
+    assert pem_validities(text) == [(int(not_before.timestamp()), int(not_after.timestamp()))]
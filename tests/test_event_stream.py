@@ -0,0 +1,98 @@
+import http.client
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+from pyarachnecdl.event_stream import EventStreamParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+# pylint: disable=wrong-import-position
+from stub_server import StubServer, USER_CONFIG_EVENTS_PATH
+
+def test_events():
+    parser = EventStreamParser()
+    assert parser.feed(b": heartbeat\n\nevent: changed\ndata: 2\nid: 2\n\ndata: x\n\n") == ["changed", "message"]
+    assert parser.last_event_id == "2"
+    assert parser.data == "x"
+
+def test_event_without_data_is_not_dispatched():
+    parser = EventStreamParser()
+    assert parser.feed(b"event: changed\n\n") == []
+    # the type is reset with the empty line
+    assert parser.feed(b"data: 1\n\n") == ["message"]
+
+def test_split_chunks_and_line_ends():
+    parser = EventStreamParser()
+    events = []
+    for byte in b"event: changed\r\ndata:1\r\n\r\nevent:changed\rdata: 2\r\r":
+        events += parser.feed(bytes([byte]))
+    # a trailing \r may be the first half of \r\n
+    events += parser.feed(b":")
+    assert events == ["changed", "changed"]
+    assert parser.data == "2"
+
+def test_multi_line_data():
+    parser = EventStreamParser()
+    assert parser.feed(b"data: a\ndata\ndata: b\n\n") == ["message"]
+    assert parser.data == "a\n\nb"
+
+def test_retry_and_id():
+    parser = EventStreamParser()
+    parser.feed(b"retry: 5000\nretry: soon\nid: 7\nid: a\0b\n\n")
+    assert parser.retry == 5000
+    assert parser.last_event_id == "7"
+
+def test_line_too_long():
+    parser = EventStreamParser()
+    with pytest.raises(ValueError):
+        parser.feed(b"data: " + b"x" * 70000)
+
+def test_stub_events_arrive_while_open():
+    server = StubServer(heartbeat=0.2).start()
+    try:
+        conn = http.client.HTTPConnection(*server._httpd.server_address[:2], timeout=5)
+        conn.request("GET", USER_CONFIG_EVENTS_PATH)
+        r = conn.getresponse()
+        assert r.getheader("Content-Type") == "text/event-stream"
+        threading.Timer(0.3, server.set_payload_size, (7000,)).start()
+        parser = EventStreamParser()
+        events = []
+        deadline = time.monotonic() + 5
+        while not events and time.monotonic() < deadline:
+            events = parser.feed(r.read1(4096))
+        assert events == ["changed"]
+        conn.close()
+    finally:
+        server.stop()
+
+def test_subscription_against_stub():
+    pytest.importorskip("requests_kerberos")
+    pytest.importorskip("dbus")
+    from pyarachnecdl.plain_settings import PlainSettings
+    from pyarachnecdl.subscription import ConfigSubscription
+
+    server = StubServer(heartbeat=0.2).start()
+    changed = threading.Event()
+    try:
+        settings = PlainSettings(os.devnull, os.devnull)
+        settings._store.config.read_dict({"General": {"adminServerurl": server.url}})
+        subscription = ConfigSubscription(settings, lambda profile: changed.set())
+        subscription.start()
+        deadline = time.monotonic() + 5
+        while not subscription.connected and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert subscription.connected
+        server.set_payload_size(7000)
+        # the stream stays open, the event has to arrive before it ends
+        assert changed.wait(3)
+        start = time.monotonic()
+        subscription.stop()
+        subscription._thread.join(5)
+        assert not subscription._thread.is_alive()
+        assert time.monotonic() - start < 2
+    finally:
+        server.stop()
@@ -0,0 +1,60 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+QtCore = pytest.importorskip("PyQt6.QtCore")
+QtDBus = pytest.importorskip("PyQt6.QtDBus")
+
+from pyarachnecdl import instance_service
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+# the running instance, its slow handlers stand in for the modal dialog
+RUNNING_INSTANCE = """
+import sys
+import time
+from PyQt6.QtCore import QCoreApplication
+from pyarachnecdl.instance_service import InstanceService
+app = QCoreApplication(sys.argv)
+service = InstanceService()
+service.settings_requested.connect(lambda: (time.sleep(5), print("settings", flush=True)))
+service.download_now_requested.connect(lambda: print("download", flush=True))
+if not service.register():
+    sys.exit(1)
+print("ready", flush=True)
+app.exec()
+"""
+
+@pytest.fixture
+def running_instance():
+    app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+    if not QtDBus.QDBusConnection.sessionBus().isConnected():
+        pytest.skip("no session bus")
+    if instance_service.forward(None):
+        pytest.skip("an instance is running")
+    proc = subprocess.Popen(
+        [sys.executable, "-c", RUNNING_INSTANCE],
+        env=dict(os.environ, PYTHONPATH=SRC_DIR),
+        stdout=subprocess.PIPE,
+        text=True
+        )
+    try:
+        assert proc.stdout.readline().strip() == "ready"
+        yield proc
+    finally:
+        proc.kill()
+        proc.wait()
+
+def test_forward_ping(running_instance):
+    assert instance_service.forward(None)
+
+def test_forward_returns_before_the_command_finishes(running_instance):
+    start = time.monotonic()
+    assert instance_service.forward("settings")
+    assert time.monotonic() - start < 2
+    assert instance_service.forward("download")
+    assert running_instance.stdout.readline().strip() == "settings"
+    assert running_instance.stdout.readline().strip() == "download"
@@ -0,0 +1,115 @@
+import email.utils
+import random
+import time
+import types
+
+from pyarachnecdl import scheduler
+from pyarachnecdl.scheduler import DownloadSchedule, parse_retry_after
+
+def test_retry_after_seconds():
+    assert parse_retry_after("120") == 120.0
+    assert parse_retry_after(" 5 ") == 5.0
+
+def test_retry_after_http_date():
+    value = email.utils.formatdate(time.time() + 60, usegmt=True)
+    assert 55 <= parse_retry_after(value) <= 60
+
+def test_retry_after_past_date():
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+
+def test_retry_after_invalid():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("") is None
+    assert parse_retry_after("-1") is None
+    assert parse_retry_after("soon") is None
+
+def settings(**kwargs):
+    values = {
+        "download_delay_seconds": 10,
+        "download_interval_seconds": 60,
+        "jitter_fraction": 0.0,
+        "max_backoff": 600,
+        "certificate_refresh_fraction": 0.0,
+        }
+    values.update(kwargs)
+    return types.SimpleNamespace(**values)
+
+def test_backoff_doubles():
+    schedule = DownloadSchedule()
+    assert schedule.next_delay(settings()) == 60
+    delays = []
+    for _ in range(4):
+        schedule.record_failure()
+        delays.append(schedule.next_delay(settings()))
+    assert delays == [60, 120, 240, 480]
+
+def test_backoff_capped():
+    schedule = DownloadSchedule()
+    for _ in range(10):
+        schedule.record_failure()
+    assert schedule.next_delay(settings()) == 600
+    # the interval wins over a smaller max_backoff
+    assert schedule.next_delay(settings(max_backoff=30)) == 60
+
+def test_success_resets_backoff():
+    schedule = DownloadSchedule()
+    schedule.record_failure()
+    schedule.record_failure()
+    schedule.record_success()
+    assert schedule.failures == 0
+    assert schedule.next_delay(settings()) == 60
+
+def test_retry_after_wins_over_shorter_delay():
+    schedule = DownloadSchedule()
+    schedule.record_failure(retry_after=300)
+    assert schedule.next_delay(settings()) == 300
+    # used only once
+    schedule.record_failure()
+    assert schedule.next_delay(settings()) == 120
+
+def test_retry_after_shorter_than_backoff():
+    schedule = DownloadSchedule()
+    for _ in range(3):
+        schedule.record_failure(retry_after=10)
+    assert schedule.next_delay(settings()) == 240
+
+def test_jitter_bounds(monkeypatch):
+    bounds = []
+    def uniform(a, b):
+        bounds.append((a, b))
+        return b
+    monkeypatch.setattr(scheduler.random, "uniform", uniform)
+    schedule = DownloadSchedule()
+    assert schedule.next_delay(settings(jitter_fraction=0.25)) == 75
+    assert schedule.first_delay(settings(jitter_fraction=0.25)) == 12.5
+    assert bounds == [(0.75, 1.25), (0.75, 1.25)]
+
+def test_jitter_spread():
+    random.seed(42)
+    schedule = DownloadSchedule()
+    delays = [schedule.next_delay(settings(jitter_fraction=0.1)) for _ in range(1000)]
+    assert all(54 <= delay <= 66 for delay in delays)
+    assert max(delays) - min(delays) > 10
+
+def test_no_interval():
+    schedule = DownloadSchedule()
+    assert schedule.next_delay(settings(download_interval_seconds=None)) is None
+    assert schedule.first_delay(settings(download_delay_seconds=None)) is None
+
+def test_resume_before_due():
+    schedule = DownloadSchedule()
+    schedule.set_due(600, now=1000)
+    assert schedule.resume_delay(now=1100) == 500
+    assert not schedule.catching_up
+
+def test_resume_overdue_catches_up():
+    schedule = DownloadSchedule()
+    assert schedule.resume_delay(now=1000) is None
+    schedule.set_due(600, now=1000)
+    delay = schedule.resume_delay(now=5000)
+    assert scheduler.RESUME_DELAY <= delay <= 2 * scheduler.RESUME_DELAY
+    assert schedule.catching_up
+    schedule.record_failure()
+    assert schedule.catching_up
+    schedule.record_success()
+    assert not schedule.catching_up
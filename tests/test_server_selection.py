@@ -0,0 +1,51 @@
+import time
+
+import pytest
+
+from pyarachnecdl import server_selection
+from pyarachnecdl.server_selection import ServerList
+
+SRV_NAME = "_arachne._tcp.example.com"
+
+@pytest.fixture(autouse=True)
+def srv_records():
+    server_selection.clear()
+    server_selection._srv_cache[SRV_NAME] = (
+        time.monotonic() + 60,
+        [(0, 5, "near.example.com", 443), (10, 0, "far.example.com", 8443)]
+        )
+    yield
+    server_selection.clear()
+
+def test_guessed_default_skipped_with_discovery():
+    servers = ServerList("https://arachne.example.com/arachne", [], SRV_NAME, guessed=True)
+    assert servers.candidates() == [
+        "https://near.example.com/arachne",
+        "https://far.example.com:8443/arachne",
+        ]
+
+def test_guessed_default_without_records():
+    servers = ServerList("https://arachne.example.com/arachne", [], "_none._tcp.invalid", guessed=True)
+    server_selection._srv_cache["_none._tcp.invalid"] = (time.monotonic() + 60, [])
+    assert servers.candidates() == ["https://arachne.example.com/arachne"]
+
+def test_fastest_healthy_server_first():
+    servers = ServerList("https://configured.example.com/arachne/", [], SRV_NAME)
+    server_selection.record_success("https://configured.example.com/arachne", 0.5)
+    server_selection.record_success("https://near.example.com/arachne", 0.3)
+    server_selection.record_success("https://far.example.com:8443/arachne", 0.1)
+    assert servers.candidates() == [
+        "https://far.example.com:8443/arachne",
+        "https://near.example.com/arachne",
+        "https://configured.example.com/arachne",
+        ]
+    server_selection.record_failure("https://far.example.com:8443/arachne")
+    assert servers.candidates()[-1] == "https://far.example.com:8443/arachne"
+
+def test_unmeasured_servers_first():
+    servers = ServerList("https://configured.example.com/arachne", ["https://other.example.com/arachne"], "")
+    server_selection.record_success("https://configured.example.com/arachne", 0.1)
+    assert servers.candidates() == [
+        "https://other.example.com/arachne",
+        "https://configured.example.com/arachne",
+        ]